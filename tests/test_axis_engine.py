@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import threading
+
+from voice_commander._utils import JoystickInfo
+from voice_commander.axis_engine import AxisTriggerEngine
+from voice_commander.axis_engine import AxisTriggerMode
+from voice_commander.joy_listener import JoyListener
+from voice_commander.joy_listener import JoystickSource
+from voice_commander.joystick_snapshot import JoystickSnapshot
+
+
+class IdleSource(JoystickSource):
+    def enumerate(self) -> dict[str, JoystickInfo]:
+        return {}
+
+    def read(self, snapshot: JoystickSnapshot) -> bool:
+        return False
+
+
+def test_trigger_callback_can_remove_the_last_trigger() -> None:
+    engine = AxisTriggerEngine(JoyListener(source=IdleSource()))
+    removed = threading.Event()
+
+    def remove_itself() -> None:
+        engine.remove(handle)
+        removed.set()
+
+    handle = engine.add(1, 'X', AxisTriggerMode.VALUE_ABOVE, 50, remove_itself)
+    dispatcher = engine._dispatcher_thread
+    assert dispatcher is not None
+    # As if the trigger had fired
+    engine._dispatch_queue.put(remove_itself)
+    assert removed.wait(timeout=5)
+    dispatcher.join(timeout=5)
+    assert not dispatcher.is_alive()
+    assert engine._dispatcher_thread is None
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import pkgutil
+import subprocess
+import sys
+
+import pytest
+
+import voice_commander
+
+MODULES = sorted(
+    f'voice_commander.{module.name}'
+    for module in pkgutil.iter_modules(voice_commander.__path__)
+    if module.name != '__main__'
+)
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_module_imports_first(module: str) -> None:
+    # Each module must be importable on its own, in a fresh interpreter, without another module imported first
+    result = subprocess.run([sys.executable, '-c', f'import {module}'], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_public_recognizer_api_imports_first() -> None:
+    code = 'from voice_commander.recognizers import GoogleWebBackend'
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from voice_commander._utils import JoystickInfo
+from voice_commander.axis_engine import AxisTriggerEngine
+from voice_commander.axis_engine import AxisTriggerMode
+from voice_commander.joy_listener import JoyListener
+from voice_commander.joy_listener import JoystickSource
+from voice_commander.joystick_snapshot import JoystickSnapshot
+
+
+class ScriptedSource(JoystickSource):
+    """
+    Delivers the given X axis values, one per read; ``None`` is a failed read which leaves the snapshot untouched,
+    and an exception is raised by the read
+    """
+
+    def __init__(self, values: list[float | None | Exception]):
+        self._values = list(values)
+        self.enumerations = 0
+
+    def enumerate(self) -> dict[str, JoystickInfo]:
+        self.enumerations += 1
+        return {'1': JoystickInfo(axes=('X',), button_count=0)}
+
+    def read(self, snapshot: JoystickSnapshot) -> bool:
+        value = self._values.pop(0)
+        if value is None:
+            return False
+        if isinstance(value, Exception):
+            raise value
+        return snapshot.fill(f'1|0|0|X={value}\n')
+
+    @property
+    def exhausted(self) -> bool:
+        return not self._values
+
+
+def _published_values(source: ScriptedSource) -> list[float]:
+    listener = JoyListener(source=source, polling_frequency=1000, max_idle_latency=None)
+    published: list[float] = []
+    listener.add_snapshot_subscriber(lambda snapshot: published.append(snapshot.get_axis_value('1', 'X')))
+    listener.start()
+    # The listener stops polling by itself once the source is exhausted
+    assert listener._axis_listener is not None
+    listener._axis_listener.join(timeout=5)
+    listener.stop()
+    return published
+
+
+def test_failed_read_is_not_published() -> None:
+    source = ScriptedSource([10, 90, None, 60])
+    assert _published_values(source) == [10, 90, 60]
+    # The failed read makes the listener enumerate the joysticks again
+    assert source.enumerations == 2
+
+
+def test_failed_first_read_is_not_published() -> None:
+    assert _published_values(ScriptedSource([None, 60])) == [60]
+
+
+def test_listener_survives_source_errors() -> None:
+    source = ScriptedSource([10, TimeoutError('no engine'), 60])
+    assert _published_values(source) == [10, 60]
+    assert source.enumerations == 2
+
+
+def test_gesture_removal_releases_axis_history() -> None:
+    listener = JoyListener(source=ScriptedSource([]))
+    engine = AxisTriggerEngine(listener)
+    rate = engine.add(1, 'X', AxisTriggerMode.RATE_ABOVE, 100, lambda: None)
+    flick = engine.add(1, 'X', AxisTriggerMode.GESTURE_FLICK, (0, 50), lambda: None)
+    assert list(listener._histories) == [('1', 'X')]
+    engine.remove(rate)
+    # Still in use by the other gesture
+    assert list(listener._histories) == [('1', 'X')]
+    engine.remove(flick)
+    assert not listener._histories
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+from thefuzz import process  # type: ignore[import-untyped]
+
+from voice_commander.phrase_index import PhraseIndex
+
+WORDS = (
+    'map fifty system supercruise group gear landing lower raise boost power engine shield weapon target next '
+    'previous cargo scoop hardpoints deploy retract lights night vision flight assist throttle zero full half '
+    'reverse docking request galaxy panel comms role fire hyperspace jump frame shift silent running chaff heat '
+    'sink camera orbit'
+).split()
+
+
+def _misspell(rng: random.Random, phrase: str) -> str:
+    chars = list(phrase)
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(chars))
+        edit = rng.random()
+        if edit < 1 / 3:
+            chars[i] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+        elif edit < 2 / 3 and len(chars) > 1:
+            del chars[i]
+        else:
+            chars.insert(i, rng.choice('abcdefghijklmnopqrstuvwxyz'))
+    return ''.join(chars)
+
+
+@pytest.fixture(scope='module')
+def dense_vocabulary() -> list[str]:
+    # 10,000 phrases made from only 50 words, so most phrases share many n-grams with each other
+    assert len(WORDS) == 50
+    rng = random.Random(0)
+    phrases: set[str] = set()
+    while len(phrases) < 10_000:
+        phrases.add(' '.join(rng.sample(WORDS, rng.choice([1, 2, 2, 3, 3, 3]))))
+    vocabulary = sorted(phrases)
+    rng.shuffle(vocabulary)
+    return vocabulary
+
+
+@pytest.fixture(scope='module')
+def dense_index(dense_vocabulary: list[str]) -> PhraseIndex:
+    index = PhraseIndex()
+    for phrase in dense_vocabulary:
+        index.add(phrase)
+    return index
+
+
+@pytest.mark.parametrize('phrase', ['fifty map', 'map fifty', 'supercruise system', 'map'])
+def test_exact_phrase_wins_over_longer_phrases(dense_index: PhraseIndex, phrase: str) -> None:
+    if phrase not in dense_index:
+        pytest.skip(f'{phrase!r} is not part of the generated vocabulary')
+    assert dense_index.best_match(phrase) == (phrase, 100)
+    assert phrase in dense_index.candidates(phrase.upper() + '!')
+
+
+def test_best_match_agrees_with_full_scan(dense_vocabulary: list[str], dense_index: PhraseIndex) -> None:
+    rng = random.Random(1)
+    queries = rng.sample(dense_vocabulary, 30) + [_misspell(rng, phrase) for phrase in rng.sample(dense_vocabulary, 30)]
+    for query in queries:
+        expected = process.extractOne(query, dense_vocabulary)
+        assert dense_index.best_match(query) == (expected[0], int(expected[1])), query
+
+
+def test_score_matrix_agrees_with_full_scan(dense_vocabulary: list[str], dense_index: PhraseIndex) -> None:
+    queries = ['fifty map', 'supercruise sistem', 'lower landing gear']
+    phrases, scores = dense_index.score_matrix(queries)
+    for row, query in enumerate(queries):
+        _, expected_score = process.extractOne(query, dense_vocabulary)
+        assert scores[row].max() == expected_score, query
+
+
+def test_removed_phrase_is_no_longer_a_candidate() -> None:
+    index = PhraseIndex()
+    index.add('open map')
+    index.add('Open Map!')
+    index.remove('open map')
+    assert index.candidates('open map') == ['Open Map!']
+    index.remove('Open Map!')
+    assert index.candidates('open map') == []
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import Future
+from threading import Thread
+from typing import Any
+
+import pytest
+
+from voice_commander import _utils
+from voice_commander.actions import AHKPressAction
+from voice_commander.actions import AHKSendAction
+from voice_commander.actions import PauseAction
+from voice_commander.cancellation import CancellationToken
+from voice_commander.engine_pool import AHKEnginePool
+from voice_commander.key_timing import KeyTimingScheduler
+from voice_commander.triggers import VoiceTrigger
+
+
+class RecordingEngine:
+    """
+    Stands in for an AHK engine, recording what is sent through it
+    """
+
+    calls: list[tuple[str, Any]] = []
+
+    def send(self, keys: str) -> None:
+        self.calls.append(('send', keys))
+
+    def _vc_run_steps(self, cancel_event: str, steps: list[str]) -> int:
+        self.calls.append(('run_steps', steps))
+        return len(steps) // 2
+
+
+class RecordingScheduler(KeyTimingScheduler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.pressed: list[str] = []
+
+    def press(
+        self, key: str, hold: float = 0.1, gap: float = 0.1, token: CancellationToken | None = None
+    ) -> Future[None]:
+        self.pressed.append(key)
+        return super().press(key, hold=hold, gap=gap, token=token)
+
+
+def test_preemption_discards_held_voice_matches() -> None:
+    trigger = VoiceTrigger('open map', max_pending=2).add_action(PauseAction(0.3))
+    stop = VoiceTrigger('stop all').add_action(PauseAction(0)).set_execution_policy('serial', priority=100)
+    listener = trigger._listener
+    for voice_trigger in (trigger, stop):
+        listener.add_trigger_phrases(
+            voice_trigger.trigger_phrases, callback=voice_trigger._on_match, match_queue=voice_trigger._match_queue
+        )
+    dispatcher = Thread(target=listener._dispatch)
+    dispatcher.start()
+    try:
+        for _ in range(6):
+            listener._deliver('open map', 'open map')
+            time.sleep(0.01)
+        time.sleep(0.1)
+        assert trigger.match_queue_stats.depth == 2
+        listener._deliver('stop all', 'stop all')
+        # Long enough for both held matches to have run, had they not been discarded
+        time.sleep(0.9)
+    finally:
+        listener._dispatch_queue.put(None)
+        dispatcher.join(timeout=5)
+        for phrase in trigger.trigger_phrases + stop.trigger_phrases:
+            listener.remove_trigger_phrase(phrase)
+    assert trigger.match_queue_stats.depth == 0
+    assert trigger.execution_stats.completed == 0
+    assert trigger.execution_stats.cancelled == 1
+    assert stop.execution_stats.completed == 1
+
+
+def test_trigger_presses_keys_through_the_scheduler(monkeypatch: pytest.MonkeyPatch) -> None:
+    RecordingEngine.calls = []
+    scheduler = RecordingScheduler()
+    monkeypatch.setattr(_utils, '_global_ahk_pool', AHKEnginePool(engine_factory=RecordingEngine))  # type: ignore[arg-type]
+    monkeypatch.setattr(_utils, '_global_key_timing_scheduler', scheduler)
+    trigger = VoiceTrigger('select all')
+    for action in (AHKSendAction('{Ctrl down}'), AHKPressAction('a', hold=0.05, gap=0), AHKSendAction('{Ctrl up}')):
+        trigger.add_action(action)
+    trigger._perform_actions(CancellationToken())
+    assert scheduler.pressed == ['a']
+    assert RecordingEngine.calls == [
+        ('send', '{Ctrl down}'),
+        ('send', '{Blind}{a DOWN}'),
+        ('send', '{Blind}{a UP}'),
+        ('send', '{Ctrl up}'),
+    ]
@@ -3,42 +3,28 @@ from __future__ import annotations
 import argparse
 import logging
 import sys
-import time
-from collections.abc import Callable
+from contextlib import closing
 
 from voice_commander._utils import get_ahk
 from voice_commander._utils import get_joystick_axis_or_pov
 from voice_commander._utils import get_logger
+from voice_commander._utils import iter_joystick_button_presses
 from voice_commander.profile import load_profile
 from voice_commander.profile import load_profile_from_name
 
 logger = get_logger()
 
 
-def _button_monitor() -> None:
+def _button_monitor(use_hotkeys: bool = False) -> None:
     ahk = get_ahk(use_global=False)
-
-    def make_callback(index: str | int, button: int) -> Callable[..., None]:
-        def inner() -> None:
-            print(f'You pressed button {button!r} on joystick with index {index!r}')
-
-        return inner
-
-    for button in range(1, 33):
-        ahk.add_hotkey(f'Joy{button}', callback=make_callback('', button))
-
-    for joystick in range(1, 17):
-        for button in range(1, 33):
-            ahk.add_hotkey(f'{joystick}Joy{button}', callback=make_callback(joystick, button))
-    ahk.start_hotkeys()
     print('Press any joystick button to show its information! Press Ctrl-C to stop.')
-    try:
-        while True:
-            time.sleep(0.2)
-    except KeyboardInterrupt:
-        print('Stopping!')
-        ahk.stop_hotkeys()
-        return
+    with closing(iter_joystick_button_presses(ahk, use_hotkeys=use_hotkeys)) as presses:
+        try:
+            for index, button in presses:
+                print(f'You pressed button {button!r} on joystick with index {index!r}')
+        except KeyboardInterrupt:
+            print('Stopping!')
+            return
 
 
 def _axis_monitor() -> None:
@@ -55,7 +41,12 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser('voice_commander')
     subparsers = parser.add_subparsers(help='sub-commands', dest='subcommand')
     run_profile_subparser = subparsers.add_parser('run-profile', help='Run a profile from a file')
-    subparsers.add_parser('joy-button-info')
+    joy_button_info_subparser = subparsers.add_parser('joy-button-info')
+    joy_button_info_subparser.add_argument(
+        '--hotkeys',
+        action='store_true',
+        help='Detect presses with hotkeys for the connected joysticks instead of polling (catches very short taps)',
+    )
     subparsers.add_parser('joy-axis-info')
     profile_group = run_profile_subparser.add_mutually_exclusive_group()
     profile_group.add_argument(
@@ -81,6 +72,6 @@ if __name__ == '__main__':
         profile.run()
         raise SystemExit(0)
     elif args.subcommand == 'joy-button-info':
-        _button_monitor()
+        _button_monitor(use_hotkeys=args.hotkeys)
     elif args.subcommand == 'joy-axis-info':
         _axis_monitor()
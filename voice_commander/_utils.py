@@ -1,18 +1,167 @@
 from __future__ import annotations
 
 import logging
+import queue
 import time
 from collections.abc import Callable
+from collections.abc import Generator
+from contextlib import closing
 from typing import Any
+from typing import NamedTuple
+from typing import TYPE_CHECKING
 from typing import Union
 
 from ahk import AHK
 from ahk.directives import NoTrayIcon
+from ahk.extensions import Extension
+
+if TYPE_CHECKING:
+    # The modules below import this one, so they are only imported when their global instance is first needed
+    from .action_executor import ActionExecutor
+    from .axis_engine import AxisTriggerEngine
+    from .engine_pool import AHKEnginePool
+    from .joy_listener import JoyListener
+    from .key_timing import KeyTimingScheduler
+    from .voice_listener import Listener
+
+# Functions added to the AHK engine for joystick polling and compiled actions. Only syntax common to AutoHotkey v1 and v2
+# is used, so the same script works with either version.
+# A topology describes the connected joysticks as "<index>:<axis>,<axis>,...:<button count>" entries separated by ";".
+# A snapshot has one line per joystick: "<index>|<button count>|<pressed buttons bitmask>|<axis>=<value>,..."
+# VCRunSteps runs compiled actions. The first argument names an event object (or is empty); the rest are pairs of
+# arguments: "send", <keys> or "sleep", <milliseconds>. Once the event is set, the run stops without performing further
+# steps, even in the middle of a sleep. Returns the number of steps that were performed completely.
+_joystick_script = r"""
+VCJoystickTopologyText() {
+    topology := ""
+    joystick := 0
+    while (joystick < 16) {
+        joystick += 1
+        info := GetKeyState(joystick "JoyInfo")
+        if (info = "")
+            continue
+        axes := "X,Y"
+        for _, axis in ["Z", "R", "U", "V"] {
+            if InStr(info, axis)
+                axes .= "," axis
+        }
+        if InStr(info, "P")
+            axes .= ",POV"
+        if (topology != "")
+            topology .= ";"
+        topology .= joystick ":" axes ":" GetKeyState(joystick "JoyButtons")
+    }
+    return topology
+}
+
+VCJoystickReadText(topology) {
+    snapshot := ""
+    if (topology = "")
+        return snapshot
+    for _, entry in StrSplit(topology, ";") {
+        fields := StrSplit(entry, ":")
+        joystick := fields[1]
+        button_count := fields[3]
+        values := ""
+        for _, axis in StrSplit(fields[2], ",") {
+            value := GetKeyState(joystick "Joy" axis)
+            if (value != "")
+                values .= axis "=" value ","
+        }
+        buttons := 0
+        button := 0
+        while (button < button_count) {
+            button += 1
+            if GetKeyState(joystick "Joy" button)
+                buttons := buttons | (1 << (button - 1))
+        }
+        snapshot .= joystick "|" button_count "|" buttons "|" RTrim(values, ",") "`n"
+    }
+    return snapshot
+}
+
+VCJoystickTopology(args*) {
+    return FormatResponse("ahk.message.StringResponseMessage", VCJoystickTopologyText())
+}
+
+VCJoystickRead(args*) {
+    return FormatResponse("ahk.message.StringResponseMessage", VCJoystickReadText(args[1]))
+}
+
+VCJoystickSnapshot(args*) {
+    return FormatResponse("ahk.message.StringResponseMessage", VCJoystickReadText(VCJoystickTopologyText()))
+}
+
+VCRunSteps(args*) {
+    cancel_event := 0
+    if (args[1] != "")
+        cancel_event := DllCall("OpenEvent", "UInt", 0x00100000, "Int", 0, "Str", args[1], "Ptr")
+    completed := 0
+    op := ""
+    for i, arg in args {
+        if (i = 1)
+            continue
+        if (op = "") {
+            op := arg
+            continue
+        }
+        if (op = "send") {
+            if (cancel_event && DllCall("WaitForSingleObject", "Ptr", cancel_event, "UInt", 0) = 0)
+                break
+            AHKSend(arg, "", "", "")
+        } else if (op = "sleep") {
+            if (!cancel_event)
+                DllCall("Sleep", "UInt", arg)
+            else if (DllCall("WaitForSingleObject", "Ptr", cancel_event, "UInt", arg) = 0)
+                break
+        }
+        completed += 1
+        op := ""
+    }
+    if (cancel_event)
+        DllCall("CloseHandle", "Ptr", cancel_event)
+    return FormatResponse("ahk.message.StringResponseMessage", completed "")
+}
+"""
+
+joystick_extension = Extension(script_text=_joystick_script)
+
+
+@joystick_extension.register
+def _vc_joystick_topology(ahk: AHK[Any]) -> str:
+    resp = ahk.function_call('VCJoystickTopology')
+    assert isinstance(resp, str)
+    return resp
+
+
+@joystick_extension.register
+def _vc_joystick_read(ahk: AHK[Any], topology: str) -> str:
+    resp = ahk.function_call('VCJoystickRead', [topology])
+    assert isinstance(resp, str)
+    return resp
+
+
+@joystick_extension.register
+def _vc_joystick_snapshot(ahk: AHK[Any]) -> str:
+    resp = ahk.function_call('VCJoystickSnapshot')
+    assert isinstance(resp, str)
+    return resp
+
+
+@joystick_extension.register
+def _vc_run_steps(ahk: AHK[Any], cancel_event: str, steps: list[str]) -> int:
+    resp = ahk.function_call('VCRunSteps', [cancel_event, *steps])
+    assert isinstance(resp, str)
+    return int(resp)
 
 
 _global_ahk: Union[None, AHK[Any]] = None
 _global_listener: Union[None, Listener] = None
 _global_joy_listener: Union[None, JoyListener] = None
+_global_axis_trigger_engine: Union[None, AxisTriggerEngine] = None
+_global_ahk_pool: Union[None, AHKEnginePool] = None
+_global_key_timing_scheduler: Union[None, KeyTimingScheduler] = None
+_global_action_executor: Union[None, ActionExecutor] = None
 
 
 def get_logger() -> logging.Logger:
@@ -23,14 +172,53 @@ def get_ahk(use_global: bool = True) -> AHK[Any]:
     global _global_ahk
     if use_global:
         if _global_ahk is None:
-            _global_ahk = AHK(directives=[NoTrayIcon(apply_to_hotkeys_process=True)])
+            _global_ahk = AHK(directives=[NoTrayIcon(apply_to_hotkeys_process=True)], extensions=[joystick_extension])
         return _global_ahk
-    return AHK(directives=[NoTrayIcon(apply_to_hotkeys_process=True)])
+    return AHK(directives=[NoTrayIcon(apply_to_hotkeys_process=True)], extensions=[joystick_extension])
+
+
+def get_ahk_pool() -> AHKEnginePool:
+    global _global_ahk_pool
+    if _global_ahk_pool is None:
+        from .engine_pool import AHKEnginePool
+
+        _global_ahk_pool = AHKEnginePool()
+    return _global_ahk_pool
+
+
+def set_ahk_pool(pool: AHKEnginePool) -> None:
+    """
+    Replace the global AHK engine pool, e.g., with one using more engines for input
+    (see :py:class:`~voice_commander.engine_pool.AHKEnginePool`).
+    Must be called before any actions are performed.
+    """
+    global _global_ahk_pool
+    _global_ahk_pool = pool
+
+
+def get_key_timing_scheduler() -> KeyTimingScheduler:
+    global _global_key_timing_scheduler
+    if _global_key_timing_scheduler is None:
+        from .key_timing import KeyTimingScheduler
+
+        _global_key_timing_scheduler = KeyTimingScheduler()
+    return _global_key_timing_scheduler
+
+
+def get_action_executor() -> ActionExecutor:
+    global _global_action_executor
+    if _global_action_executor is None:
+        from .action_executor import ActionExecutor
+
+        _global_action_executor = ActionExecutor()
+    return _global_action_executor
 
 
 def get_listener() -> Listener:
     global _global_listener
     if _global_listener is None:
+        from .voice_listener import Listener
+
         _global_listener = Listener()
     return _global_listener
 
@@ -38,92 +226,231 @@ def get_listener() -> Listener:
 def get_joy_listener() -> JoyListener:
     global _global_joy_listener
     if _global_joy_listener is None:
+        from .joy_listener import JoyListener
+
         _global_joy_listener = JoyListener()
     return _global_joy_listener
 
 
-def get_joystick_button() -> tuple[str, str]:
+def set_joy_listener(joy_listener: JoyListener) -> None:
+    """
+    Replace the global joystick listener, e.g., with one replaying a recording
+    (see :py:class:`~voice_commander.joystick_recording.ReplaySource`).
+    Must be called before any joystick axis triggers are created.
+    """
+    global _global_joy_listener, _global_axis_trigger_engine
+    _global_joy_listener = joy_listener
+    _global_axis_trigger_engine = None
+
+
+def get_axis_trigger_engine() -> AxisTriggerEngine:
+    global _global_axis_trigger_engine
+    if _global_axis_trigger_engine is None:
+        from .axis_engine import AxisTriggerEngine
+
+        _global_axis_trigger_engine = AxisTriggerEngine(get_joy_listener())
+    return _global_axis_trigger_engine
+
+
+def get_joystick_button(use_hotkeys: bool = False) -> tuple[str, str]:
     """
     Wait for any joystick button to be pressed, return a tuple the AHK index of the
      joystick and the button's name (as strings)
 
     NOTE: POV hats do not count as buttons. Use get_joystick_axis_or_pov for waiting on POV hat inputs.
+
+    :param use_hotkeys: detect presses with AHK hotkeys (registered only for the buttons of connected joysticks)
+      instead of polling button states. Hotkeys also catch very short taps which could fall between two polls.
     """
     ahk = get_ahk(use_global=False)
-    import queue
+    with closing(iter_joystick_button_presses(ahk, use_hotkeys=use_hotkeys)) as presses:
+        joystick, button = next(presses)
+    return joystick, str(button)
+
+
+def iter_joystick_button_presses(
+    ahk: AHK[Any], use_hotkeys: bool = False, polling_interval: float = 0.02, rescan_interval: float = 5.0
+) -> Generator[tuple[str, int], None, None]:
+    """
+    Yield ``(joystick index, button number)`` for every joystick button press, forever.
+
+    By default, the button states of all connected joysticks are read in one AHK call every ``polling_interval``
+    seconds and newly set bits of each joystick's button bitmask are reported. Joysticks are enumerated again every
+    ``rescan_interval`` seconds to pick up newly connected devices.
 
-    q: queue.Queue[tuple[str | int, int]] = queue.Queue()
+    :param use_hotkeys: instead of polling, register AHK hotkeys for the buttons of the joysticks connected when
+      starting, which also catches very short taps
+    """
+    if use_hotkeys:
+        yield from _iter_joystick_button_hotkeys(ahk)
+        return
+    topology = _get_joystick_topology(ahk)
+    last_scan = time.monotonic()
+    previous = {joystick: state.buttons for joystick, state in _get_joystick_snapshot(ahk, topology).items()}
+    while True:
+        if time.monotonic() - last_scan >= rescan_interval:
+            topology = _get_joystick_topology(ahk)
+            last_scan = time.monotonic()
+        for joystick, state in _get_joystick_snapshot(ahk, topology).items():
+            if joystick == '':
+                continue
+            pressed = state.buttons & ~previous.get(joystick, 0)
+            previous[joystick] = state.buttons
+            button = 1
+            while pressed:
+                if pressed & 1:
+                    yield joystick, button
+                pressed >>= 1
+                button += 1
+        time.sleep(polling_interval)
 
-    def make_callback(index: str | int, button: int) -> Callable[..., None]:
+
+def _iter_joystick_button_hotkeys(ahk: AHK[Any]) -> Generator[tuple[str, int], None, None]:
+    q: queue.SimpleQueue[tuple[str, int]] = queue.SimpleQueue()
+
+    def make_callback(index: str, button: int) -> Callable[..., None]:
         def inner() -> None:
             q.put((index, button))
 
         return inner
 
-    for button in range(1, 33):
-        ahk.add_hotkey(f'Joy{button}', callback=make_callback('', button))
-
-    for joystick in range(1, 17):
-        for button in range(1, 33):
+    for joystick, info in _get_joystick_topology(ahk).items():
+        for button in range(1, info.button_count + 1):
             ahk.add_hotkey(f'{joystick}Joy{button}', callback=make_callback(joystick, button))
     try:
         ahk.start_hotkeys()
-        index, button = q.get()
-        return str(index), str(button)
+        while True:
+            yield q.get()
     finally:
         ahk.stop_hotkeys()
-        del ahk
-
-
-def _get_all_joystick_values(ahk: AHK[Any]) -> dict[str, dict[str, int | float]]:
-    joystick_initial_values = {}
-    joystick: str | int
-    for joystick in range(0, 17):
-        supported_axes = 'XY'
-        if joystick == 0:
-            joystick = ''
-        info_resp = ahk.key_state(f'{joystick}JoyInfo')
-        if not info_resp:
+
+
+class JoystickInfo(NamedTuple):
+    """
+    What a connected joystick provides
+    """
+
+    axes: tuple[str, ...]  # supported axes, including POV if the joystick has a POV hat
+    button_count: int
+
+
+class JoystickState(NamedTuple):
+    """
+    The state of a single joystick at one point in time
+    """
+
+    axes: dict[str, int | float]  # axis name (X, Y, Z, R, U, V, POV) -> value
+    buttons: int  # bitmask of pressed buttons; bit 0 is button 1
+    button_count: int
+
+    def is_pressed(self, button: int) -> bool:
+        return bool(self.buttons >> (button - 1) & 1)
+
+
+def _parse_number(value: str) -> int | float:
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def _get_joystick_topology(ahk: AHK[Any]) -> dict[str, JoystickInfo]:
+    """
+    Enumerate the connected joysticks and the axes they support.
+
+    :return: joystick info keyed by AHK joystick index (as a string)
+    """
+    topology: dict[str, JoystickInfo] = {}
+    payload: str = ahk._vc_joystick_topology()
+    for entry in payload.split(';'):
+        if not entry:
             continue
-        assert isinstance(info_resp, str)
-        for additional_axis in 'ZRUV':
-            if additional_axis in info_resp:
-                supported_axes += additional_axis
-        initial_values = {}
-        for axis in supported_axes:
-            initial_value = ahk.key_state(f'{joystick}Joy{axis}')
-            if isinstance(initial_value, (int, float)):
-                initial_values[axis] = initial_value
-            else:
+        joystick, axes, button_count = entry.split(':')
+        topology[joystick] = JoystickInfo(axes=tuple(axes.split(',')), button_count=int(button_count or 0))
+    return topology
+
+
+def _enumerate_joysticks(ahk: AHK[Any], known: dict[str, JoystickInfo] | None = None) -> dict[str, JoystickInfo]:
+    """
+    Like :py:func:`_get_joystick_topology`, but also makes sure subsequent reads of the joysticks report real values
+
+    :param known: the topology of a previous enumeration with the same engine. Those joysticks were primed already,
+      so only joysticks that are new (or changed) are.
+    """
+    topology = _get_joystick_topology(ahk)
+    unprimed = {joystick: info for joystick, info in topology.items() if (known or {}).get(joystick) != info}
+    if unprimed:
+        # XXX: for some reason, we have to prime this, as some axes report 100 on first poll always
+        _get_joystick_snapshot(ahk, unprimed)
+        time.sleep(0.1)
+    return topology
+
+
+def _topology_spec(topology: dict[str, JoystickInfo]) -> str:
+    return ';'.join(f'{joystick}:{",".join(info.axes)}:{info.button_count}' for joystick, info in topology.items())
+
+
+def _read_joystick_payload(ahk: AHK[Any], topology: dict[str, JoystickInfo]) -> str:
+    """
+    Read the joysticks (and axes) of ``topology`` in a single round trip to the AHK engine, returning the raw
+    snapshot payload (see ``_joystick_script``)
+    """
+    if not topology:
+        return ''
+    payload: str = ahk._vc_joystick_read(_topology_spec(topology))
+    return payload
+
+
+def _get_joystick_snapshot(ahk: AHK[Any], topology: dict[str, JoystickInfo] | None = None) -> dict[str, JoystickState]:
+    """
+    Get the axes, POV and button states of joysticks in a single round trip to the AHK engine.
+
+    The engine must have been created with the joystick extension (as :py:func:`get_ahk` does).
+
+    :param topology: the joysticks (and axes) to read, as returned by :py:func:`_get_joystick_topology`. When
+      omitted, all connected joysticks are enumerated as part of the same call.
+    :return: joystick states keyed by AHK joystick index (as a string). The first joystick is also available under
+      ``''``, which is how it is addressed in AHK key names like ``JoyX``.
+    """
+    snapshot: dict[str, JoystickState] = {}
+    payload: str
+    if topology is None:
+        payload = ahk._vc_joystick_snapshot()
+    else:
+        payload = _read_joystick_payload(ahk, topology)
+    for line in payload.splitlines():
+        if not line:
+            continue
+        joystick, button_count, buttons, values = line.split('|')
+        axes: dict[str, int | float] = {}
+        for item in values.split(','):
+            if not item:
                 continue
-        if 'P' in info_resp:
-            pov_value = ahk.key_state(f'{joystick}JoyPOV')
-            if isinstance(pov_value, (int, float)):
-                initial_values['POV'] = pov_value
-        joystick_initial_values[str(joystick)] = initial_values
-    return joystick_initial_values
+            axis, _, value = item.partition('=')
+            axes[axis] = _parse_number(value)
+        snapshot[joystick] = JoystickState(axes=axes, buttons=int(buttons), button_count=int(button_count or 0))
+    if '1' in snapshot:
+        snapshot[''] = snapshot['1']
+    return snapshot
 
 
 def get_joystick_axis_or_pov() -> tuple[str, str, int | float]:
     ahk = get_ahk(use_global=False)
-    # XXX: for some reason, we have to prime this, as some axes report 100 on first poll always
-    _get_all_joystick_values(ahk)
-    time.sleep(0.1)
+    topology = _enumerate_joysticks(ahk)
 
-    joystick_initial_values = _get_all_joystick_values(ahk)
+    joystick_initial_values = _get_joystick_snapshot(ahk, topology)
     while True:
-        current_values = _get_all_joystick_values(ahk)
-        for joystick, joystick_values in current_values.items():
-            initial_values = joystick_initial_values.get(joystick)
-            if not initial_values:
+        current_values = _get_joystick_snapshot(ahk, topology)
+        for joystick, joystick_state in current_values.items():
+            initial_state = joystick_initial_values.get(joystick)
+            if initial_state is None:
                 continue
-            for axis in joystick_values:
-                current_value = joystick_values[axis]
+            initial_values = initial_state.axes
+            for axis in joystick_state.axes:
+                if axis not in initial_values:
+                    continue
+                current_value = joystick_state.axes[axis]
                 initial_value = initial_values[axis]
                 if abs(current_value - initial_value) > 30 or (axis == 'POV' and current_value != initial_value):
                     return joystick, axis, current_value
         time.sleep(0.1)
-
-
-from .voice_listener import Listener  # noqa
-from .joy_listener import JoyListener  # noqa
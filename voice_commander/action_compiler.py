@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import ctypes
+import itertools
+import os
+import re
+import sys
+from collections.abc import Sequence
+from threading import Lock
+
+from ._utils import get_ahk_pool
+from ._utils import get_logger
+from .actions import ActionBase
+from .cancellation import CancellationToken
+from .cancellation import current_token
+from .cancellation import sleep
+from .engine_pool import EngineRole
+
+logger = get_logger()
+
+
+# Explicit key down/up events in AHK send strings, like "{Shift down}"
+_key_event = re.compile(r'\{([^{}\s]+) (down|up)\}', re.IGNORECASE)
+
+_event_ids = itertools.count()
+
+
+class _EngineCancelEvent:
+    """
+    A named Windows event that is set when a cancellation token is cancelled.
+
+    The AHK engine waits on the event instead of sleeping during the pauses of a compiled run, so cancelling the token
+    interrupts the run right away. Elsewhere (where there is no AutoHotkey to run the engine anyway), :py:attr:`name`
+    is empty and the engine sleeps normally.
+    """
+
+    def __init__(self, token: CancellationToken | None):
+        self.name = ''
+        self._token = token
+        self._handle: int | None = None
+        self._lock = Lock()
+        if token is None or sys.platform != 'win32':
+            return
+        name = f'Local\\voice-commander-cancel-{os.getpid()}-{next(_event_ids)}'
+        handle = ctypes.windll.kernel32.CreateEventW(None, True, False, name)
+        if not handle:
+            logger.warning('Could not create an event for cancelling compiled actions')
+            return
+        self.name = name
+        self._handle = handle
+        token.add_callback(self._set)
+
+    def _set(self) -> None:
+        with self._lock:
+            if self._handle is not None and sys.platform == 'win32':
+                ctypes.windll.kernel32.SetEvent(self._handle)
+
+    def close(self) -> None:
+        if self._token is not None:
+            self._token.remove_callback(self._set)
+        with self._lock:
+            if self._handle is not None and sys.platform == 'win32':
+                ctypes.windll.kernel32.CloseHandle(self._handle)
+            self._handle = None
+
+
+class CompiledActions:
+    """
+    A run of consecutive actions performed as a single AHK engine call.
+
+    The steps of all actions are sent to the engine together and executed there, including the pauses between them,
+    so the run takes one round trip and its key timing does not depend on Python. Pauses at the very start or end of
+    the run are slept in Python instead, so the engine is not held while nothing is sent.
+
+    Cancelling the action sequence interrupts the run, also in the middle of a pause: the engine performs no further
+    steps, and keys that the run pressed down and had not released yet are released.
+    """
+
+    def __init__(self, actions: Sequence[ActionBase]):
+        self.actions = list(actions)
+        steps: list[tuple[str, str]] = []
+        for action in self.actions:
+            action_steps = action._get_ahk_steps()
+            assert action_steps is not None, f'{action!r} cannot be compiled'
+            for op, arg in action_steps:
+                if op == 'sleep' and steps and steps[-1][0] == 'sleep':
+                    steps[-1] = ('sleep', str(int(steps[-1][1]) + int(arg)))
+                else:
+                    steps.append((op, arg))
+        self.delay_before = 0.0
+        while steps and steps[0][0] == 'sleep':
+            self.delay_before += int(steps.pop(0)[1]) / 1000
+        self.delay_after = 0.0
+        while steps and steps[-1][0] == 'sleep':
+            self.delay_after += int(steps.pop()[1]) / 1000
+        self.steps = steps
+
+    def perform(self) -> None:
+        token = current_token()
+        if self.delay_before and not sleep(self.delay_before):
+            return
+        if self.steps and not (token is not None and token.cancelled):
+            self._run_steps(token)
+        if self.delay_after:
+            sleep(self.delay_after)
+
+    def _run_steps(self, token: CancellationToken | None) -> None:
+        args = [arg for step in self.steps for arg in step]
+        pool = get_ahk_pool()
+        cancel_event = _EngineCancelEvent(token)
+        try:
+            with pool.lease(EngineRole.INPUT) as engine:
+                completed = engine._vc_run_steps(cancel_event.name, args)
+        finally:
+            cancel_event.close()
+        if completed == len(self.steps):
+            return
+        held: dict[str, str] = {}
+        for op, arg in self.steps[:completed]:
+            if op != 'send':
+                continue
+            for key, direction in _key_event.findall(arg):
+                if direction.lower() == 'down':
+                    held[key.lower()] = key
+                else:
+                    held.pop(key.lower(), None)
+        if held:
+            logger.info(f'Releasing {len(held)} key(s) held by a cancelled action sequence')
+            with pool.lease(EngineRole.INPUT) as engine:
+                engine.send(''.join(f'{{Blind}}{{{key} up}}' for key in held.values()))
+
+
+def _is_compilable(action: ActionBase) -> bool:
+    # Actions with conditions must be checked right before they run, so they are never compiled
+    return not action.conditions and action._get_ahk_steps() is not None
+
+
+def _should_compile(run: list[ActionBase]) -> bool:
+    # Only worth it if the run sends something and takes more than one engine call on its own
+    steps = [step for action in run for step in action._get_ahk_steps() or []]
+    return any(op == 'send' for op, _ in steps) and len(steps) > 1
+
+
+def compile_actions(actions: Sequence[ActionBase]) -> list[ActionBase | CompiledActions]:
+    """
+    Merge runs of consecutive AHK-expressible actions (sends and pauses without conditions) into
+    :py:class:`CompiledActions`. Any other action ends a run and is kept as it is. Key presses are among those: they
+    are timed by the shared :py:class:`~voice_commander.key_timing.KeyTimingScheduler`, which only holds an engine
+    while a key event is sent, not for the whole time the key is held down.
+    """
+    compiled: list[ActionBase | CompiledActions] = []
+    run: list[ActionBase] = []
+
+    def end_run() -> None:
+        if _should_compile(run):
+            compiled.append(CompiledActions(run))
+        else:
+            compiled.extend(run)
+        run.clear()
+
+    for action in actions:
+        if _is_compilable(action):
+            run.append(action)
+        else:
+            end_run()
+            compiled.append(action)
+    end_run()
+    return compiled
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import enum
+import time
+from collections import deque
+from collections.abc import Callable
+from collections.abc import Hashable
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import NamedTuple
+from typing import NotRequired
+from typing import TypedDict
+
+from ._utils import get_logger
+from .cancellation import CancellationToken
+from .cancellation import running_under
+
+logger = get_logger()
+
+
+class ExecutionPolicy(enum.StrEnum):
+    """
+    What an :py:class:`~voice_commander.action_executor.ActionExecutor` does with a new invocation of a trigger while
+    earlier invocations of it are still running
+    """
+
+    SERIAL = 'serial'  # Invocations are queued and run one at a time, in order
+    DROP_WHILE_RUNNING = 'drop_while_running'  # New invocations are discarded while one is running
+    RESTART = 'restart'  # The running invocation is cancelled (and queued ones discarded); the new one runs once it has stopped
+    PARALLEL = 'parallel'  # Up to max_parallel invocations run at the same time; further ones are queued
+
+
+class ExecutionConfigDict(TypedDict):
+    policy: NotRequired[ExecutionPolicy]
+    max_parallel: NotRequired[int]
+    max_queued: NotRequired[int | None]
+    priority: NotRequired[int]
+
+
+class ExecutionStats(NamedTuple):
+    queued: int
+    running: int
+    completed: int
+    failed: int
+    dropped: int
+    cancelled: int
+    last_queue_wait: float
+    last_run_time: float
+    max_queue_wait: float
+    max_run_time: float
+
+
+class Invocation:
+    """
+    One queued or running invocation of a trigger's actions
+    """
+
+    def __init__(self, function: Callable[[CancellationToken], None], priority: int = 0):
+        self.function = function
+        self.priority = priority
+        self.future: Future[None] = Future()
+        #: cancelled when the invocation should stop
+        self.token = CancellationToken()
+        #: whether the invocation was cancelled because a higher-priority invocation started
+        self.preempted = False
+        self.queued_at = time.perf_counter()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def cancel(self) -> None:
+        self.token.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.token.cancelled
+
+    @property
+    def queue_wait(self) -> float | None:
+        """
+        Seconds between being submitted and starting to run
+        """
+        if self.started_at is None:
+            return None
+        return self.started_at - self.queued_at
+
+    @property
+    def run_time(self) -> float | None:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+class _KeyState:
+    def __init__(self) -> None:
+        self.pending: deque[Invocation] = deque()
+        self.running: set[Invocation] = set()
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.last_queue_wait = 0.0
+        self.last_run_time = 0.0
+        self.max_queue_wait = 0.0
+        self.max_run_time = 0.0
+
+
+class ActionExecutor:
+    """
+    Runs trigger invocations on a thread pool, so a long-running macro never blocks the thread that fired the trigger
+    (a hotkey callback, the voice dispatcher or the joystick polling thread).
+
+    Invocations are grouped by a key (normally the trigger) and each key has an
+    :py:class:`~voice_commander.action_executor.ExecutionPolicy` deciding what happens when it is invoked again while
+    running. Invocations are cancelled cooperatively: the function receives a
+    :py:class:`~voice_commander.cancellation.CancellationToken` (which is also its
+    :py:func:`~voice_commander.cancellation.current_token`) and should stop soon after it is cancelled. Pauses and key
+    presses observe the token, so cancellation takes effect within milliseconds.
+
+    Invocations have a priority: starting an invocation preempts (cancels) all running and queued invocations of
+    other keys with a lower priority, e.g. for a "stop everything" command.
+
+    Queue wait and run time are logged for every invocation and summarized in :py:meth:`stats`.
+    """
+
+    def __init__(self, max_workers: int = 8):
+        """
+
+        :param max_workers: the maximum number of invocations (of all keys) running at the same time
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='action-executor')
+        self._states: dict[Hashable, _KeyState] = {}
+        self._lock = Lock()
+
+    def submit(
+        self,
+        key: Hashable,
+        function: Callable[[CancellationToken], None],
+        policy: ExecutionPolicy | str = ExecutionPolicy.SERIAL,
+        max_parallel: int = 1,
+        max_queued: int | None = None,
+        priority: int = 0,
+    ) -> Invocation | None:
+        """
+        Invoke ``function`` according to ``policy``.
+
+        :param key: identifies whose invocation this is; policies apply to the invocations of the same key
+        :param function: called with the invocation's cancellation token
+        :param max_parallel: for the ``parallel`` policy, how many invocations may run at the same time
+        :param max_queued: the maximum number of invocations waiting to run; further invocations are dropped
+        :param priority: invocations of other keys with a lower priority are cancelled
+        :return: the invocation, or ``None`` if it was dropped
+        """
+        policy = ExecutionPolicy(policy)
+        limit = max_parallel if policy is ExecutionPolicy.PARALLEL else 1
+        invocation = Invocation(function, priority=priority)
+        with self._lock:
+            state = self._states.setdefault(key, _KeyState())
+            if policy is ExecutionPolicy.DROP_WHILE_RUNNING and (state.running or state.pending):
+                state.dropped += 1
+                logger.info('Trigger is still running; dropping invocation')
+                return None
+            self._preempt(key, priority)
+            if policy is ExecutionPolicy.RESTART:
+                for running in state.running:
+                    running.cancel()
+                while state.pending:
+                    self._discard(state, state.pending.popleft())
+            if len(state.running) >= limit and max_queued is not None and len(state.pending) >= max_queued:
+                state.dropped += 1
+                logger.info('Trigger invocation queue is full; dropping invocation')
+                return None
+            state.pending.append(invocation)
+            self._start_pending(key, state, limit)
+        return invocation
+
+    def _preempt(self, key: Hashable, priority: int) -> None:
+        # must be called with the lock held
+        for other_key, state in self._states.items():
+            if other_key == key:
+                continue
+            for running in state.running:
+                if running.priority < priority and not running.cancelled:
+                    logger.info('Preempting lower-priority trigger invocation')
+                    running.preempted = True
+                    running.cancel()
+            for pending in [pending for pending in state.pending if pending.priority < priority]:
+                state.pending.remove(pending)
+                pending.preempted = True
+                self._discard(state, pending)
+
+    def _discard(self, state: _KeyState, invocation: Invocation) -> None:
+        invocation.cancel()
+        invocation.future.cancel()
+        state.cancelled += 1
+
+    def _start_pending(self, key: Hashable, state: _KeyState, limit: int) -> None:
+        # must be called with the lock held
+        while state.pending and len(state.running) < limit:
+            invocation = state.pending.popleft()
+            state.running.add(invocation)
+            self._executor.submit(self._run, key, state, invocation, limit)
+
+    def _run(self, key: Hashable, state: _KeyState, invocation: Invocation, limit: int) -> None:
+        invocation.started_at = time.perf_counter()
+        error: BaseException | None = None
+        try:
+            if invocation.future.set_running_or_notify_cancel():
+                with running_under(invocation.token):
+                    invocation.function(invocation.token)
+        except BaseException as e:
+            error = e
+            logger.exception('Error while performing trigger actions')
+        invocation.finished_at = time.perf_counter()
+        queue_wait = invocation.started_at - invocation.queued_at
+        run_time = invocation.finished_at - invocation.started_at
+        logger.debug(f'Trigger invocation waited {queue_wait * 1000:.1f} ms and ran for {run_time * 1000:.1f} ms')
+        with self._lock:
+            state.running.discard(invocation)
+            if error is not None:
+                state.failed += 1
+            elif invocation.cancelled:
+                state.cancelled += 1
+            else:
+                state.completed += 1
+            state.last_queue_wait = queue_wait
+            state.last_run_time = run_time
+            state.max_queue_wait = max(state.max_queue_wait, queue_wait)
+            state.max_run_time = max(state.max_run_time, run_time)
+            self._start_pending(key, state, limit)
+        if error is not None:
+            invocation.future.set_exception(error)
+        elif not invocation.future.cancelled():
+            invocation.future.set_result(None)
+
+    def cancel(self, key: Hashable) -> None:
+        """
+        Cancel the running invocations of ``key`` and discard the queued ones
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return
+            for running in state.running:
+                running.cancel()
+            while state.pending:
+                self._discard(state, state.pending.popleft())
+
+    def cancel_all(self) -> None:
+        """
+        Cancel all running invocations and discard all queued ones
+        """
+        with self._lock:
+            for state in self._states.values():
+                for running in state.running:
+                    running.cancel()
+                while state.pending:
+                    self._discard(state, state.pending.popleft())
+
+    def stats(self, key: Hashable) -> ExecutionStats:
+        with self._lock:
+            state = self._states.get(key) or _KeyState()
+            return ExecutionStats(
+                queued=len(state.pending),
+                running=len(state.running),
+                completed=state.completed,
+                failed=state.failed,
+                dropped=state.dropped,
+                cancelled=state.cancelled,
+                last_queue_wait=state.last_queue_wait,
+                last_run_time=state.last_run_time,
+                max_queue_wait=state.max_queue_wait,
+                max_run_time=state.max_run_time,
+            )
@@ -2,8 +2,8 @@ from __future__ import annotations
 
 import abc
 import os.path
-import time
 import warnings
+from concurrent.futures import Future
 from typing import Any
 from typing import NotRequired
 from typing import Self
@@ -14,10 +14,15 @@ from typing import Unpack
 
 from ahk import TitleMatchMode
 
-from ._utils import get_ahk
+from ._utils import get_ahk_pool
+from ._utils import get_key_timing_scheduler
 from ._utils import get_logger
+from .cancellation import CancellationToken
+from .cancellation import current_token
+from .cancellation import sleep
 from .conditions import ConditionBase
 from .conditions import restore_condition
+from .engine_pool import EngineRole
 
 winsound: Any = None
 try:
@@ -63,6 +68,14 @@ class ActionBase:
     @abc.abstractmethod
     def perform(self) -> None: ...
 
+    def _get_ahk_steps(self) -> list[tuple[str, str]] | None:
+        """
+        The action expressed as AHK engine steps (``('send', keys)`` or ``('sleep', milliseconds)``), so it can be
+        compiled together with neighbouring actions (see :py:mod:`voice_commander.action_compiler`); ``None`` if the
+        action cannot be expressed that way
+        """
+        return None
+
     @abc.abstractmethod
     def _get_config(self) -> Any: ...
 
@@ -122,8 +135,11 @@ class AHKSendAction(ActionBase):
         super().__init__()
 
     def perform(self) -> None:
-        engine = get_ahk()
-        engine.send(self.send_string)
+        with get_ahk_pool().lease(EngineRole.INPUT) as engine:
+            engine.send(self.send_string)
+
+    def _get_ahk_steps(self) -> list[tuple[str, str]]:
+        return [('send', self.send_string)]
 
     def _get_config(self) -> ConfigDict:
         return {'send_string': self.send_string}
@@ -132,31 +148,43 @@ class AHKSendAction(ActionBase):
 class AHKPressAction(ActionBase):
     """
     Press (and release) a single key.
-    Adds small delay between key down and key up, useful for making sure games register inputs.
+    Holds the key down for a short time, useful for making sure games register inputs. Key events are timed by the
+    shared :py:class:`~voice_commander.key_timing.KeyTimingScheduler`.
 
     Availability: Windows
     """
 
     class ConfigDict(TypedDict):
         key: str
+        hold: NotRequired[float]
+        gap: NotRequired[float]
 
-    def __init__(self, key: str):
+    def __init__(self, key: str, hold: float = 0.1, gap: float = 0.1):
         """
 
         :param key: the key to press. Do not include braces for special keys.
+        :param hold: how long the key is held down, in seconds
+        :param gap: how long to wait after releasing the key before the action is complete, in seconds
         """
         self.key: str = key
+        self.hold: float = hold
+        self.gap: float = gap
         super().__init__()
 
     def perform(self) -> None:
-        engine = get_ahk()
-        engine.send(f'{{Blind}}{{{self.key} DOWN}}', blocking=False)
-        time.sleep(0.1)
-        engine.send(f'{{Blind}}{{{self.key} UP}}', blocking=False)
-        time.sleep(0.1)
+        self.perform_async(token=current_token()).result()
+
+    def perform_async(self, token: CancellationToken | None = None) -> Future[None]:
+        """
+        Start the key press without waiting for it
+
+        :param token: if cancelled, the key is released right away and the gap is skipped
+        :return: a future which completes when the press (including the gap after it) is done
+        """
+        return get_key_timing_scheduler().press(self.key, hold=self.hold, gap=self.gap, token=token)
 
     def _get_config(self) -> ConfigDict:
-        return {'key': self.key}
+        return {'key': self.key, 'hold': self.hold, 'gap': self.gap}
 
 
 class WinSoundAction(ActionBase):
@@ -221,10 +249,10 @@ class AHKMakeWindowActiveAction(ActionBase):
         super().__init__()
 
     def perform(self) -> None:
-        engine = get_ahk()
-        win = engine.win_get(**self._win_get_kwargs)
-        assert win is not None, f'Could not find window with parameters {self._win_get_kwargs!r}'
-        win.activate()
+        with get_ahk_pool().lease(EngineRole.WINDOW) as engine:
+            win = engine.win_get(**self._win_get_kwargs)
+            assert win is not None, f'Could not find window with parameters {self._win_get_kwargs!r}'
+            win.activate()
 
     def _get_config(self) -> ConfigDict:
         return self._win_get_kwargs
@@ -249,7 +277,11 @@ class PauseAction(ActionBase):
         super().__init__()
 
     def perform(self) -> None:
-        time.sleep(self.seconds)
+        # Ends early if the action sequence is cancelled
+        sleep(self.seconds)
+
+    def _get_ahk_steps(self) -> list[tuple[str, str]]:
+        return [('sleep', str(round(self.seconds * 1000)))]
 
     def _get_config(self) -> ConfigDict:
         return {'seconds': self.seconds}
@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import enum
+import queue
+from collections.abc import Callable
+from threading import current_thread
+from threading import Lock
+from threading import Thread
+
+import numpy as np
+import numpy.typing as npt
+
+from ._utils import get_logger
+from .joy_listener import _joystick_key
+from .joy_listener import AxisHistory
+from .joy_listener import JoyListener
+from .joystick_snapshot import JoystickLayout
+from .joystick_snapshot import JoystickSnapshot
+
+logger = get_logger()
+
+
+class AxisTriggerMode(enum.IntEnum):
+    """
+    Available trigger modes for joystick axis trigger.
+    """
+
+    VALUE_BETWEEN = 1  # Triggers when axis value is within the specified range. Resets when the value falls outside the specified range.
+    VALUE_ABOVE = 2  # Triggers when the axis value is greater than the specified value. Resets when the axis value is less than the specified value.
+    VALUE_BELOW = 3  # Triggers when the axis value is less than the specified value. Resets when the axis value is greater than the specified value.
+    VALUE_EQUALS = 4  # Triggers when the axis value is **exactly** the specified value
+    RATE_ABOVE = 5  # Triggers when the axis moves faster than the specified value (units per second, either direction) over the gesture window. Resets when it moves slower.
+    GESTURE_FLICK = 6  # Triggers when the axis moves from the first to past the second specified value within the gesture window. Resets when the value is back before the second value.
+
+
+class _RateDetector:
+    # Tracks the rate of change over the gesture window. The start of the window is kept as a position in the axis
+    # history and only ever moves forward, so each sample costs amortized O(1). It is the last sample taken at or
+    # before the window's edge, so there is a start to measure from even when samples are further apart than the
+    # window.
+    def __init__(self, history: AxisHistory, threshold: float, window: float):
+        self._history = history
+        self._threshold = threshold
+        self._window = window
+        self._start = -1
+        self._awaiting_reset = True
+
+    def update(self) -> bool:
+        history = self._history
+        newest = history.newest
+        if newest < 0:
+            return False
+        now = history.timestamp(newest)
+        start = max(self._start, history.oldest)
+        while start + 1 < newest and now - history.timestamp(start + 1) >= self._window:
+            start += 1
+        self._start = start
+        elapsed = now - history.timestamp(start)
+        rate = (history.value(newest) - history.value(start)) / elapsed if elapsed > 0 else 0.0
+        if abs(rate) > self._threshold:
+            if not self._awaiting_reset:
+                self._awaiting_reset = True
+                return True
+        else:
+            self._awaiting_reset = False
+        return False
+
+
+class _FlickDetector:
+    # Remembers when the axis was last at (or before) the start value; crossing the end value soon enough after that
+    # is a flick. Moving from the start value to the end value between two consecutive samples always counts, since
+    # it cannot be told apart from a fast enough movement when samples are further apart than the window.
+    def __init__(self, history: AxisHistory, start_value: float, end_value: float, window: float):
+        self._history = history
+        self._start_value = start_value
+        self._end_value = end_value
+        self._upward = end_value > start_value
+        self._window = window
+        self._at_start: float | None = None
+        self._awaiting_reset = True
+
+    def update(self) -> bool:
+        history = self._history
+        newest = history.newest
+        if newest < 0:
+            return False
+        now = history.timestamp(newest)
+        value = history.value(newest)
+        # The previous sample marks the latest the movement can have started
+        window = max(self._window, now - history.timestamp(newest - 1)) if newest > history.oldest else self._window
+        if (value <= self._start_value) if self._upward else (value >= self._start_value):
+            self._at_start = now
+        if (value >= self._end_value) if self._upward else (value <= self._end_value):
+            fired = not self._awaiting_reset and self._at_start is not None and now - self._at_start <= window
+            self._awaiting_reset = True
+            return fired
+        self._awaiting_reset = False
+        return False
+
+
+class AxisTriggerEngine:
+    """
+    Evaluates the thresholds of all joystick axis triggers at once.
+
+    Every trigger is a row in a set of arrays (the bounds of its zone, whether the bounds are inclusive, whether
+    leaving the zone requires crossing a bound, and whether it is waiting to be reset). Each joystick snapshot is
+    evaluated for all triggers in a single NumPy pass, so the cost per sample stays flat as the number of triggers
+    grows. Callbacks of triggers that fired are run on the engine's dispatcher thread, so slow actions do not delay
+    joystick polling.
+
+    A trigger fires when the axis value enters its zone and it is not waiting to be reset; it is then reset once the
+    value leaves the zone.
+
+    Gesture triggers (``RATE_ABOVE`` and ``GESTURE_FLICK``) depend on how values change over time rather than on the
+    current value alone. They are evaluated from the listener's per-axis sample history on every snapshot, at
+    constant cost per sample. While gesture triggers are installed, the listener keeps polling at its full rate even
+    when the joysticks are idle, so gestures starting from rest are sampled closely enough to be recognized.
+    """
+
+    def __init__(self, joy_listener: JoyListener):
+        self._joy_listener = joy_listener
+        self._lock = Lock()
+        self._handles: npt.NDArray[np.int64] = np.zeros(0, dtype=np.int64)
+        self._lower: npt.NDArray[np.float64] = np.zeros(0, dtype=np.float64)
+        self._upper: npt.NDArray[np.float64] = np.zeros(0, dtype=np.float64)
+        self._inclusive: npt.NDArray[np.bool_] = np.zeros(0, dtype=np.bool_)
+        # Whether a value counts as outside the zone only if it is strictly beyond one of the bounds
+        # (for VALUE_ABOVE / VALUE_BELOW, a value exactly at the threshold neither fires nor resets)
+        self._strict_outside: npt.NDArray[np.bool_] = np.zeros(0, dtype=np.bool_)
+        self._awaiting_reset: npt.NDArray[np.bool_] = np.zeros(0, dtype=np.bool_)
+        self._slots: npt.NDArray[np.intp] = np.zeros(0, dtype=np.intp)  # index into self._axes per trigger
+        self._axes: list[tuple[str, str]] = []  # distinct (joystick, axis) pairs in use
+        self._callbacks: list[Callable[[], None]] = []
+        self._gestures: dict[int, tuple[_RateDetector | _FlickDetector, Callable[[], None], tuple[int | str, str]]] = {}
+        self._next_handle = 0
+        self._last_values: npt.NDArray[np.float64] | None = None
+        # positions of self._axes in the snapshot layout last seen; len(layout) where an axis is not in the layout
+        self._gather_layout: JoystickLayout | None = None
+        self._gather: npt.NDArray[np.intp] = np.zeros(0, dtype=np.intp)
+        self._dispatch_queue: queue.SimpleQueue[Callable[[], None] | None] = queue.SimpleQueue()
+        self._dispatcher_thread: Thread | None = None
+
+    def __len__(self) -> int:
+        return len(self._callbacks) + len(self._gestures)
+
+    @staticmethod
+    def _zone(
+        mode: AxisTriggerMode, trigger_value: int | float | tuple[int | float, int | float]
+    ) -> tuple[float, float, bool, bool]:
+        # returns lower bound, upper bound, inclusive, strict_outside
+        if mode == AxisTriggerMode.VALUE_BETWEEN:
+            assert isinstance(trigger_value, tuple)
+            lower_bound, upper_bound = trigger_value
+            return float(lower_bound), float(upper_bound), False, False
+        assert isinstance(trigger_value, (int, float))
+        if mode == AxisTriggerMode.VALUE_ABOVE:
+            return float(trigger_value), np.inf, False, True
+        if mode == AxisTriggerMode.VALUE_BELOW:
+            return -np.inf, float(trigger_value), False, True
+        if mode == AxisTriggerMode.VALUE_EQUALS:
+            return float(trigger_value), float(trigger_value), True, False
+        raise ValueError(f'Invalid trigger mode: {mode!r}')
+
+    def add(
+        self,
+        joystick_index: int | str,
+        axis: str,
+        mode: AxisTriggerMode,
+        trigger_value: int | float | tuple[int | float, int | float],
+        callback: Callable[[], None],
+        gesture_window: float = 0.15,
+    ) -> int:
+        """
+        Add a trigger to the engine.
+
+        :param gesture_window: for gesture modes, the time span (in seconds) over which the movement is considered
+        :return: a handle for removing the trigger again
+        """
+        if mode in (AxisTriggerMode.RATE_ABOVE, AxisTriggerMode.GESTURE_FLICK):
+            return self._add_gesture(joystick_index, axis, mode, trigger_value, callback, gesture_window)
+        lower, upper, inclusive, strict_outside = self._zone(mode, trigger_value)
+        key = (_joystick_key(joystick_index), axis)
+        with self._lock:
+            if key not in self._axes:
+                self._axes.append(key)
+            handle = self._next_handle
+            self._next_handle += 1
+            self._handles = np.append(self._handles, handle)
+            self._lower = np.append(self._lower, lower)
+            self._upper = np.append(self._upper, upper)
+            self._inclusive = np.append(self._inclusive, inclusive)
+            self._strict_outside = np.append(self._strict_outside, strict_outside)
+            self._awaiting_reset = np.append(self._awaiting_reset, True)
+            self._slots = np.append(self._slots, self._axes.index(key))
+            self._callbacks.append(callback)
+            self._last_values = None
+            self._gather_layout = None
+            first = len(self) == 1
+        if first:
+            self._start()
+        return handle
+
+    def _add_gesture(
+        self,
+        joystick_index: int | str,
+        axis: str,
+        mode: AxisTriggerMode,
+        trigger_value: int | float | tuple[int | float, int | float],
+        callback: Callable[[], None],
+        gesture_window: float,
+    ) -> int:
+        history = self._joy_listener.history(joystick_index, axis)
+        detector: _RateDetector | _FlickDetector
+        if mode == AxisTriggerMode.RATE_ABOVE:
+            assert isinstance(trigger_value, (int, float))
+            detector = _RateDetector(history, float(trigger_value), gesture_window)
+        else:
+            assert isinstance(trigger_value, tuple)
+            start_value, end_value = trigger_value
+            detector = _FlickDetector(history, float(start_value), float(end_value), gesture_window)
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            self._gestures[handle] = (detector, callback, (joystick_index, axis))
+            first = len(self) == 1
+        # Gestures need closely spaced samples, also right after the axis has been idle
+        self._joy_listener.pin_polling_rate()
+        if first:
+            self._start()
+        return handle
+
+    def remove(self, handle: int) -> None:
+        with self._lock:
+            gesture = self._gestures.pop(handle, None)
+            if gesture is not None:
+                last = not len(self)
+            else:
+                last = self._remove_row(handle)
+        if gesture is not None:
+            _, _, (joystick_index, axis) = gesture
+            self._joy_listener.unpin_polling_rate()
+            self._joy_listener.release_history(joystick_index, axis)
+        if last:
+            self._stop()
+
+    def _remove_row(self, handle: int) -> bool:
+        rows = np.flatnonzero(self._handles == handle)
+        if not len(rows):
+            raise ValueError(f'No trigger with handle {handle!r}')
+        row = int(rows[0])
+        self._handles = np.delete(self._handles, row)
+        self._lower = np.delete(self._lower, row)
+        self._upper = np.delete(self._upper, row)
+        self._inclusive = np.delete(self._inclusive, row)
+        self._strict_outside = np.delete(self._strict_outside, row)
+        self._awaiting_reset = np.delete(self._awaiting_reset, row)
+        self._slots = np.delete(self._slots, row)
+        del self._callbacks[row]
+        self._last_values = None
+        self._gather_layout = None
+        return not len(self)
+
+    def _start(self) -> None:
+        # Each dispatcher gets its own queue, so a dispatcher still finishing the callback that stopped it never
+        # takes work (or the stop signal) meant for its successor
+        self._dispatch_queue = queue.SimpleQueue()
+        self._dispatcher_thread = Thread(
+            target=self._dispatch, args=(self._dispatch_queue,), name='axis-trigger-dispatcher', daemon=True
+        )
+        self._dispatcher_thread.start()
+        self._joy_listener.add_snapshot_subscriber(self._on_snapshot)
+
+    def _stop(self) -> None:
+        self._joy_listener.remove_snapshot_subscriber(self._on_snapshot)
+        self._dispatch_queue.put(None)
+        # A trigger callback may remove the last trigger; the dispatcher then exits once the callback returns
+        if self._dispatcher_thread is not None and self._dispatcher_thread is not current_thread():
+            self._dispatcher_thread.join()
+        self._dispatcher_thread = None
+
+    def evaluate(self, values: npt.NDArray[np.float64]) -> npt.NDArray[np.intp]:
+        """
+        Evaluate all triggers for new axis values and update their reset state.
+
+        :param values: the current value of every trigger's axis (one entry per trigger); NaN where unknown
+        :return: the rows of the triggers that fired
+        """
+        known = ~np.isnan(values)
+        above_lower = (values > self._lower) | (self._inclusive & (values == self._lower))
+        below_upper = (values < self._upper) | (self._inclusive & (values == self._upper))
+        inside = above_lower & below_upper
+        outside = np.where(self._strict_outside, (values < self._lower) | (values > self._upper), ~inside)
+        fired = inside & known & ~self._awaiting_reset
+        reset = outside & known & self._awaiting_reset
+        self._awaiting_reset = (self._awaiting_reset | fired) & ~reset
+        return np.flatnonzero(fired)
+
+    def _on_snapshot(self, snapshot: JoystickSnapshot) -> None:
+        with self._lock:
+            gesture_callbacks = [callback for detector, callback, _ in self._gestures.values() if detector.update()]
+        for callback in gesture_callbacks:
+            self._dispatch_queue.put(callback)
+        with self._lock:
+            if not self._callbacks:
+                return
+            layout = snapshot.layout
+            if self._gather_layout is not layout:
+                missing = len(layout)
+                self._gather = np.array(
+                    [slot if (slot := layout.axis_slot(*key)) is not None else missing for key in self._axes],
+                    dtype=np.intp,
+                )
+                self._gather_layout = layout
+            # one extra NaN entry for axes which are not in the layout
+            values = np.append(snapshot.as_numpy().astype(np.float64), np.nan)
+            axis_values = values[self._gather]
+            if self._last_values is not None and np.array_equal(axis_values, self._last_values, equal_nan=True):
+                return
+            self._last_values = axis_values
+            fired = self.evaluate(axis_values[self._slots])
+            callbacks = [self._callbacks[row] for row in fired.tolist()]
+        for callback in callbacks:
+            self._dispatch_queue.put(callback)
+
+    def _dispatch(self, dispatch_queue: queue.SimpleQueue[Callable[[], None] | None]) -> None:
+        while True:
+            callback = dispatch_queue.get()
+            if callback is None:
+                break
+            try:
+                callback()
+            except Exception:
+                logger.exception('Error performing axis trigger')
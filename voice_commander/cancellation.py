@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+from collections.abc import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Event
+from threading import Lock
+
+from ._utils import get_logger
+
+logger = get_logger()
+
+
+class CancellationToken:
+    """
+    Signals that a running action sequence should stop.
+
+    Actions observe the token of the sequence they run in (see :py:func:`current_token`): pauses end as soon as it is
+    cancelled and key presses release their key right away. Other code can register callbacks to be notified.
+    """
+
+    def __init__(self, spin_threshold: float = 0.002):
+        """
+
+        :param spin_threshold: :py:meth:`sleep` busy-waits for the last this many seconds, for precise timing
+        """
+        self._event = Event()
+        self._callbacks: list[Callable[[], None]] = []
+        self._lock = Lock()
+        self._spin_threshold = spin_threshold
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception('Error in cancellation callback')
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """
+        Call ``callback`` (once) when the token is cancelled; immediately, if it already is
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def sleep(self, seconds: float) -> bool:
+        """
+        Sleep for ``seconds``, or until the token is cancelled.
+
+        :return: whether the full time was slept (``False`` if cancelled)
+        """
+        deadline = time.perf_counter() + seconds
+        remaining = seconds - self._spin_threshold
+        if remaining > 0 and self._event.wait(remaining):
+            return False
+        while time.perf_counter() < deadline:
+            if self._event.is_set():
+                return False
+        return not self._event.is_set()
+
+
+_current_token: ContextVar[CancellationToken | None] = ContextVar('current_token', default=None)
+
+
+def current_token() -> CancellationToken | None:
+    """
+    The cancellation token of the action sequence running on this thread, if any
+    """
+    return _current_token.get()
+
+
+@contextmanager
+def running_under(token: CancellationToken) -> Generator[CancellationToken, None, None]:
+    """
+    Make ``token`` the :py:func:`current_token` for the duration of a ``with`` block
+    """
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def sleep(seconds: float) -> bool:
+    """
+    Sleep for ``seconds``, ending early if the current action sequence is cancelled.
+
+    :return: whether the full time was slept
+    """
+    token = current_token()
+    if token is None:
+        time.sleep(seconds)
+        return True
+    return token.sleep(seconds)
@@ -12,7 +12,8 @@ from typing import Unpack
 import ahk.exceptions
 from ahk import TitleMatchMode
 
-from voice_commander._utils import get_ahk
+from voice_commander._utils import get_ahk_pool
+from voice_commander.engine_pool import EngineRole
 
 _condition_registry: dict[str, Type['ConditionBase']] = {}
 T_Condition = TypeVar('T_Condition', bound='ConditionBase')
@@ -89,9 +90,9 @@ class AHKWindowExists(ConditionBase):
         self.win_get_kwargs = win_get_kwargs
 
     def check(self) -> bool:
-        engine = get_ahk()
         try:
-            return engine.win_exists(**self.win_get_kwargs, blocking=False).result()
+            with get_ahk_pool().lease(EngineRole.WINDOW) as engine:
+                return engine.win_exists(**self.win_get_kwargs, blocking=False).result()
         except ahk.exceptions.WindowNotFoundException:
             return False
 
@@ -122,9 +123,9 @@ class AHKWindowIsActive(ConditionBase):
         self.win_get_kwargs = win_get_kwargs
 
     def check(self) -> bool:
-        engine = get_ahk()
         try:
-            return engine.win_is_active(**self.win_get_kwargs, blocking=False).result()
+            with get_ahk_pool().lease(EngineRole.WINDOW) as engine:
+                return engine.win_is_active(**self.win_get_kwargs, blocking=False).result()
         except ahk.exceptions.WindowNotFoundException:
             return False
 
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import enum
+import threading
+from collections.abc import Callable
+from collections.abc import Generator
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Any
+
+from ahk import AHK
+from ahk.exceptions import AHKProtocolError
+
+from ._utils import get_ahk
+from ._utils import get_logger
+
+logger = get_logger()
+
+
+class EngineRole(enum.StrEnum):
+    """
+    What an AHK engine of an :py:class:`~voice_commander.engine_pool.AHKEnginePool` is used for. Each role has its own
+    engines, so e.g. a slow window query never delays sending input.
+    """
+
+    INPUT = 'input'  # Sending keys and other input
+    WINDOW = 'window'  # Finding, querying and activating windows
+    JOYSTICK = 'joystick'  # Polling joysticks
+
+
+# Errors that mean the AHK process is gone or its output can no longer be trusted; the engine is replaced
+ENGINE_FAILURES: tuple[type[BaseException], ...] = (AHKProtocolError, OSError, EOFError)
+
+
+def _terminate(engine: AHK[Any]) -> None:
+    # A crashed engine's process may be hung rather than gone; make sure it does not linger
+    process = getattr(getattr(engine, '_transport', None), '_proc', None)
+    if process is None:
+        return
+    try:
+        process.kill()
+    except Exception:
+        logger.debug('Could not terminate AHK engine process', exc_info=True)
+
+
+class _RolePool:
+    def __init__(self, size: int):
+        self.size = size
+        self.idle: list[AHK[Any]] = []
+        self.created = 0
+        self.available = threading.Condition()
+
+
+class AHKEnginePool:
+    """
+    A set of AHK engines (each its own AutoHotkey process), grouped by :py:class:`~voice_commander.engine_pool.EngineRole`.
+
+    Engines are created on demand, up to the configured number per role, and leased out exclusively: a caller gets an
+    engine no one else is using and returns it when done. When all engines of a role are in use, callers wait for one
+    to be returned. An engine whose process crashed (i.e., a call on it raised an AHK protocol or OS error) is
+    discarded on release, and a fresh one is started the next time one is needed.
+
+    Hotkeys are not handled by the pool; they stay on the global engine returned by :py:func:`~voice_commander._utils.get_ahk`.
+    """
+
+    def __init__(
+        self,
+        sizes: Mapping[EngineRole | str, int] | None = None,
+        engine_factory: Callable[[], AHK[Any]] | None = None,
+    ):
+        """
+
+        :param sizes: the number of engines for each role. Roles not given use one engine, except ``input``, which
+          uses two.
+        :param engine_factory: creates new engines. By default, engines are created like :py:func:`~voice_commander._utils.get_ahk` does.
+        """
+        role_sizes: dict[EngineRole, int] = {EngineRole.INPUT: 2, EngineRole.WINDOW: 1, EngineRole.JOYSTICK: 1}
+        for role, size in (sizes or {}).items():
+            if size < 1:
+                raise ValueError(f'Pool size for role {role!r} must be at least 1')
+            role_sizes[EngineRole(role)] = size
+        self._pools = {role: _RolePool(size) for role, size in role_sizes.items()}
+        self._engine_factory = engine_factory or (lambda: get_ahk(use_global=False))
+
+    def size(self, role: EngineRole | str) -> int:
+        return self._pools[EngineRole(role)].size
+
+    def acquire(self, role: EngineRole | str, timeout: float | None = None) -> AHK[Any]:
+        """
+        Lease an engine of ``role``. It must be given back with :py:meth:`release`; prefer :py:meth:`lease`, which
+        does that automatically.
+
+        :param timeout: how long to wait, in seconds, for an engine to become available (``None`` waits indefinitely)
+        :raises TimeoutError: if no engine became available within ``timeout``
+        """
+        pool = self._pools[EngineRole(role)]
+        with pool.available:
+            if not pool.available.wait_for(lambda: pool.idle or pool.created < pool.size, timeout=timeout):
+                raise TimeoutError(f'No {EngineRole(role)} AHK engine became available within {timeout} seconds')
+            if pool.idle:
+                return pool.idle.pop()
+            pool.created += 1
+        try:
+            return self._engine_factory()
+        except BaseException:
+            with pool.available:
+                pool.created -= 1
+                pool.available.notify()
+            raise
+
+    def release(self, role: EngineRole | str, engine: AHK[Any], crashed: bool = False) -> None:
+        """
+        Return a leased engine to the pool.
+
+        :param crashed: the engine's process failed; it is terminated, and replaced by a new engine when needed
+        """
+        pool = self._pools[EngineRole(role)]
+        if crashed:
+            logger.warning(f'Discarding crashed {EngineRole(role)} AHK engine; a new one will be started when needed')
+            _terminate(engine)
+        with pool.available:
+            if crashed:
+                pool.created -= 1
+            else:
+                pool.idle.append(engine)
+            pool.available.notify()
+
+    @contextmanager
+    def lease(self, role: EngineRole | str, timeout: float | None = None) -> Generator[AHK[Any], None, None]:
+        """
+        Lease an engine of ``role`` for the duration of a ``with`` block::
+
+            with get_ahk_pool().lease(EngineRole.INPUT) as engine:
+                engine.send('abc')
+
+        If the block raises an error indicating that the engine's process failed, the engine is replaced.
+        """
+        engine = self.acquire(role, timeout=timeout)
+        crashed = False
+        try:
+            yield engine
+        except ENGINE_FAILURES as e:
+            # TimeoutError is an OSError, but says nothing about the engine
+            crashed = not isinstance(e, TimeoutError)
+            raise
+        finally:
+            self.release(role, engine, crashed=crashed)
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import enum
+import time
+from collections import deque
+from collections.abc import Collection
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from threading import Lock
+
+import numpy as np
+import speech_recognition as sr  # type: ignore[import-untyped]
+from speech_recognition import AudioData
+
+from ._utils import get_logger
+from .recognizers import Alternative
+from .recognizers import RecognizerBackend
+
+logger = get_logger()
+
+
+class BreakerState(enum.Enum):
+    CLOSED = 'closed'  # backend is healthy and used normally
+    OPEN = 'open'  # backend is skipped until the cooldown has passed
+    HALF_OPEN = 'half_open'  # a single trial call is allowed to decide whether to close the breaker again
+
+
+class CircuitBreaker:
+    """
+    Stops using a backend whose recent calls fail or are too slow too often.
+
+    A call counts as failed if it raised an error or took longer than ``slow_call_threshold``. When the failure rate
+    over the last ``window`` calls reaches ``failure_rate``, the breaker opens for ``cooldown`` seconds. Afterwards, a
+    single trial call decides whether it closes again.
+    """
+
+    def __init__(
+        self,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_threshold: float = 5.0,
+        cooldown: float = 30.0,
+    ):
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._min_calls = min_calls
+        self._failure_rate = failure_rate
+        self._slow_call_threshold = slow_call_threshold
+        self._cooldown = cooldown
+        self._state = BreakerState.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = Lock()
+
+    @property
+    def state(self) -> BreakerState:
+        with self._lock:
+            if self._state is BreakerState.OPEN and time.monotonic() - self._opened_at >= self._cooldown:
+                self._state = BreakerState.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """
+        Whether a call may be made now. In the half-open state, only one trial call is allowed at a time.
+        """
+        state = self.state
+        with self._lock:
+            if state is BreakerState.CLOSED:
+                return True
+            if state is BreakerState.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record(self, success: bool, latency: float) -> None:
+        failed = not success or latency > self._slow_call_threshold
+        with self._lock:
+            if self._state is BreakerState.HALF_OPEN:
+                self._trial_in_flight = False
+                if failed:
+                    self._open()
+                else:
+                    self._state = BreakerState.CLOSED
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(failed)
+            if self._state is BreakerState.CLOSED and len(self._outcomes) >= self._min_calls:
+                if sum(self._outcomes) / len(self._outcomes) >= self._failure_rate:
+                    self._open()
+
+    def _open(self) -> None:
+        logger.warning(f'Circuit breaker opened; backend will be skipped for {self._cooldown} seconds')
+        self._state = BreakerState.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+class HedgedBackend(RecognizerBackend):
+    """
+    Sends audio to a primary backend and, if it has not answered within its usual latency, also to a secondary
+    backend; whichever answers first wins.
+
+    The hedge delay is the configured percentile of the primary's recent latencies. Each backend has a
+    :py:class:`~voice_commander.hedging.CircuitBreaker`: while the primary's breaker is open, requests go straight to
+    the secondary, and a failing primary fails over to the secondary immediately.
+
+    Availability: all platforms
+    """
+
+    def __init__(
+        self,
+        primary: RecognizerBackend,
+        secondary: RecognizerBackend,
+        hedge_percentile: float = 95.0,
+        min_hedge_delay: float = 0.2,
+        initial_hedge_delay: float = 1.0,
+        latency_window: int = 50,
+        primary_breaker: CircuitBreaker | None = None,
+        secondary_breaker: CircuitBreaker | None = None,
+    ):
+        """
+
+        :param primary: the preferred backend (e.g., a remote, more accurate recognizer)
+        :param secondary: the fallback backend (e.g., a local engine)
+        :param hedge_percentile: the percentile (0-100) of the primary's recent latencies after which the secondary
+          is also asked
+        :param min_hedge_delay: the minimum time, in seconds, to wait for the primary before hedging
+        :param initial_hedge_delay: the hedge delay used until enough primary latencies have been observed
+        :param latency_window: the number of recent primary latencies considered
+        """
+        self.primary = primary
+        self.secondary = secondary
+        self.name = f'hedged({primary.name}, {secondary.name})'
+        self._hedge_percentile = hedge_percentile
+        self._min_hedge_delay = min_hedge_delay
+        self._initial_hedge_delay = initial_hedge_delay
+        self._latencies: deque[float] = deque(maxlen=latency_window)
+        self._latency_lock = Lock()
+        self._breakers = {
+            id(primary): primary_breaker or CircuitBreaker(),
+            id(secondary): secondary_breaker or CircuitBreaker(),
+        }
+        # Each backend has its own workers, so requests piling up at a slow primary never delay the hedge requests
+        # meant to work around it
+        self._executors = {
+            id(backend): ThreadPoolExecutor(max_workers=4, thread_name_prefix=f'hedged-recognizer-{role}')
+            for role, backend in (('primary', primary), ('secondary', secondary))
+        }
+
+    @property
+    def hedge_delay(self) -> float:
+        with self._latency_lock:
+            if len(self._latencies) < 5:
+                return self._initial_hedge_delay
+            delay = float(np.percentile(np.array(self._latencies), self._hedge_percentile))
+        return max(self._min_hedge_delay, delay)
+
+    def breaker(self, backend: RecognizerBackend) -> CircuitBreaker:
+        return self._breakers[id(backend)]
+
+    def set_phrases(self, phrases: Collection[str]) -> None:
+        self.primary.set_phrases(phrases)
+        self.secondary.set_phrases(phrases)
+
+    def _call(self, backend: RecognizerBackend, audio: AudioData) -> list[Alternative]:
+        start = time.perf_counter()
+        success = False
+        try:
+            result = backend.recognize_alternatives(audio)
+            success = True
+            return result
+        except sr.UnknownValueError:
+            # the backend worked; there just was no recognizable speech
+            success = True
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            self.breaker(backend).record(success, latency)
+            if backend is self.primary and success:
+                with self._latency_lock:
+                    self._latencies.append(latency)
+
+    def _submit(self, backend: RecognizerBackend, audio: AudioData) -> Future[list[Alternative]] | None:
+        if not self.breaker(backend).allow():
+            logger.debug(f'Skipping {backend.name} recognizer; circuit breaker is open')
+            return None
+        return self._executors[id(backend)].submit(self._call, backend, audio)
+
+    @staticmethod
+    def _is_answer(future: Future[list[Alternative]]) -> bool:
+        # A result or "no speech recognized" both count as an answer; backend failures do not
+        exc = future.exception()
+        return exc is None or isinstance(exc, sr.UnknownValueError)
+
+    def recognize(self, audio: AudioData) -> str:
+        return self.recognize_alternatives(audio)[0][0]
+
+    def recognize_alternatives(self, audio: AudioData) -> list[Alternative]:
+        pending: set[Future[list[Alternative]]] = set()
+        primary = self._submit(self.primary, audio)
+        if primary is not None:
+            pending.add(primary)
+            done, _ = wait(pending, timeout=self.hedge_delay)
+            if done and self._is_answer(primary):
+                return primary.result()
+            if not done:
+                logger.debug(f'{self.primary.name} recognizer is slow; hedging with {self.secondary.name}')
+            else:
+                logger.debug(f'{self.primary.name} recognizer failed; failing over to {self.secondary.name}')
+                pending.clear()
+        secondary = self._submit(self.secondary, audio)
+        if secondary is not None:
+            pending.add(secondary)
+        last_error: BaseException | None = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if self._is_answer(future):
+                    return future.result()
+                last_error = future.exception()
+        if last_error is not None:
+            raise sr.RequestError(f'all recognizers failed; last error: {last_error}')
+        raise sr.RequestError('no recognizer available; all circuit breakers are open')
@@ -1,38 +1,439 @@
 from __future__ import annotations
 
+import abc
+import math
 import time
+from array import array
+from collections.abc import Callable
 from threading import Lock
 from threading import Thread
+from typing import Any
+from typing import NamedTuple
+from typing import TypeAlias
 
+import numpy as np
 from ahk import AHK
 
-from ._utils import _get_all_joystick_values
+from ._utils import _enumerate_joysticks
+from ._utils import _read_joystick_payload
+from ._utils import get_ahk_pool
 from ._utils import get_logger
+from ._utils import JoystickInfo
+from ._utils import JoystickState
+from .engine_pool import ENGINE_FAILURES
+from .engine_pool import EngineRole
+from .joystick_snapshot import JoystickLayout
+from .joystick_snapshot import JoystickSnapshot
 
 logger = get_logger()
 
 
+class AxisEvent(NamedTuple):
+    """
+    A change of a joystick axis (or POV) value
+    """
+
+    joystick: str  # AHK joystick index
+    axis: str
+    value: int | float
+    timestamp: float  # the timestamp of the snapshot that held the value (see JoystickSource.timestamped)
+
+
+AxisSubscriber: TypeAlias = Callable[[AxisEvent], None]
+SnapshotSubscriber: TypeAlias = Callable[[JoystickSnapshot], None]
+
+
+def _has_activity(previous: JoystickSnapshot, snapshot: JoystickSnapshot, threshold: float) -> bool:
+    # Whether any button, POV hat or axis (by more than ``threshold``) changed between two snapshots
+    if previous.layout is not snapshot.layout or previous.buttons != snapshot.buttons:
+        return True
+    values = snapshot.as_numpy()
+    previous_values = previous.as_numpy()
+    both_missing = np.isnan(values) & np.isnan(previous_values)
+    changed = np.where(
+        snapshot.layout.pov_mask, values != previous_values, np.abs(values - previous_values) > threshold
+    )
+    return bool(np.any(changed & ~both_missing))
+
+
+class AxisHistory:
+    """
+    Fixed-size ring buffer of the most recent timestamped samples of one axis.
+
+    Samples are addressed by their absolute index (the number of samples appended before them), so consumers can keep
+    a position in the history across appends. Only the last ``size`` samples are retained.
+    """
+
+    def __init__(self, size: int = 64):
+        assert size >= 2
+        self.size = size
+        self._timestamps = array('d', [0.0]) * size
+        self._values = array('d', [0.0]) * size
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.size)
+
+    @property
+    def newest(self) -> int:
+        """
+        The absolute index of the most recent sample (-1 if there are none)
+        """
+        return self._count - 1
+
+    @property
+    def oldest(self) -> int:
+        """
+        The absolute index of the oldest retained sample
+        """
+        return max(0, self._count - self.size)
+
+    def append(self, timestamp: float, value: float) -> None:
+        position = self._count % self.size
+        self._timestamps[position] = timestamp
+        self._values[position] = value
+        self._count += 1
+
+    def timestamp(self, index: int) -> float:
+        return self._timestamps[index % self.size]
+
+    def value(self, index: int) -> float:
+        return self._values[index % self.size]
+
+
+class JoystickSource(abc.ABC):
+    """
+    Where a :py:class:`~voice_commander.joy_listener.JoyListener` gets joystick data from
+    """
+
+    #: Whether :py:meth:`read` itself waits until new data is due. If so, the listener does not wait between polls.
+    paced: bool = False
+    #: Whether :py:meth:`read` sets the snapshot's timestamp, e.g. to when recorded data was captured. Otherwise the
+    #: listener sets it to the time (``time.monotonic()``) it read the snapshot.
+    timestamped: bool = False
+
+    @abc.abstractmethod
+    def enumerate(self) -> dict[str, JoystickInfo]:
+        """
+        Return the connected joysticks, keyed by AHK joystick index
+        """
+
+    @abc.abstractmethod
+    def read(self, snapshot: JoystickSnapshot) -> bool:
+        """
+        Fill ``snapshot`` (whose layout matches the last enumeration) with the current joystick state.
+
+        :return: whether every axis of the layout could be read. If not, the listener does not publish the snapshot
+          and enumerates the joysticks again.
+        """
+
+    @property
+    def exhausted(self) -> bool:
+        """
+        Whether the source has no more data; the listener stops polling once it is exhausted
+        """
+        return False
+
+    def start(self) -> None:
+        """
+        Called by the listener before it starts polling, e.g. to acquire resources needed for reading
+        """
+
+    def stop(self) -> None:
+        """
+        Called by the listener after it stopped polling
+        """
+
+
+class AHKJoystickSource(JoystickSource):
+    """
+    Reads joysticks through an AutoHotkey engine. Unless an engine is given, the source leases a ``joystick`` engine
+    of the global :py:class:`~voice_commander.engine_pool.AHKEnginePool` while the listener is running (returning it
+    when the listener stops) and replaces it if its process crashes.
+
+    Availability: Windows
+    """
+
+    def __init__(self, ahk: AHK[Any] | None = None, acquire_timeout: float | None = 10.0):
+        """
+
+        :param ahk: the engine to read joysticks with, instead of leasing one from the pool
+        :param acquire_timeout: how long (in seconds) to wait for a pool engine when starting, if all are leased
+          (e.g. by other listeners); ``None`` waits indefinitely
+        """
+        self._pool = get_ahk_pool() if ahk is None else None
+        self.ahk = ahk
+        self._acquire_timeout = acquire_timeout
+        self._topology: dict[str, JoystickInfo] = {}
+
+    def start(self) -> None:
+        if self._pool is not None and self.ahk is None:
+            self.ahk = self._pool.acquire(EngineRole.JOYSTICK, timeout=self._acquire_timeout)
+
+    def stop(self) -> None:
+        if self._pool is not None and self.ahk is not None:
+            self._pool.release(EngineRole.JOYSTICK, self.ahk)
+            self.ahk = None
+            # A different engine may be leased next time, which has not primed any joystick
+            self._topology = {}
+
+    def _engine(self) -> AHK[Any] | None:
+        # The engine to use, leasing a replacement for a crashed one if needed. While none is available, reads fail
+        # and are retried on the next poll.
+        if self.ahk is None and self._pool is not None:
+            try:
+                self.ahk = self._pool.acquire(EngineRole.JOYSTICK, timeout=self._acquire_timeout)
+            except TimeoutError:
+                logger.warning('No joystick AHK engine available; trying again on the next poll')
+        return self.ahk
+
+    def _replace_engine(self) -> None:
+        assert self._pool is not None and self.ahk is not None
+        self._pool.release(EngineRole.JOYSTICK, self.ahk, crashed=True)
+        self.ahk = None
+        # The new engine has not primed any joystick yet
+        self._topology = {}
+
+    def enumerate(self) -> dict[str, JoystickInfo]:
+        engine = self._engine()
+        if engine is None:
+            return {}
+        try:
+            self._topology = _enumerate_joysticks(engine, known=self._topology)
+        except ENGINE_FAILURES:
+            if self._pool is None:
+                raise
+            self._replace_engine()
+        return self._topology
+
+    def read(self, snapshot: JoystickSnapshot) -> bool:
+        engine = self._engine()
+        if engine is None:
+            return False
+        try:
+            payload = _read_joystick_payload(engine, self._topology)
+        except ENGINE_FAILURES:
+            if self._pool is None:
+                raise
+            self._replace_engine()
+            return False
+        return snapshot.fill(payload)
+
+
+def _joystick_key(joystick_index: int | str) -> str:
+    # The first joystick can be addressed as '' (as in AHK key names like JoyX) or 1
+    return str(joystick_index) or '1'
+
+
 class JoyListener:
     """
-    Obtains state of joystick axes
+    Obtains state of joystick axes and buttons
+
+    Intended to be used as a global listener to minimize the amount of AHK calls needed to support all triggers.
+    Each poll reads every connected joystick in a single AHK call.
+
+    The connected joysticks and their axes are enumerated once and cached; polls only read the known axes. The
+    joysticks are enumerated again every ``rescan_interval`` seconds (to pick up newly connected devices) and
+    whenever a read shows a joystick has gone missing.
+
+    Instead of polling the listener, consumers can :py:meth:`subscribe` to an axis; subscribers are called on the
+    polling thread whenever the axis value changes (and once with the current value after subscribing). Consumers
+    interested in every joystick at once can :py:meth:`add_snapshot_subscriber` to receive each new snapshot.
 
-    Intended to be used as a global listener to minimize the amount of AHK calls needed to support all triggers
+    Each poll is written into a :py:class:`~voice_commander.joystick_snapshot.JoystickSnapshot` which is then
+    published by swapping it with the previous one (double buffering), so polls do not allocate. Readers never take a
+    lock: :py:meth:`read_snapshot` and :py:meth:`get_joystick_axis_value` check the snapshot's sequence number and
+    simply read again if the snapshot was overwritten while they were reading it.
+
+    The polling rate adapts to activity: while joysticks are being used, they are polled at ``polling_frequency``.
+    Once nothing has moved for ``idle_timeout`` seconds, the polling interval is doubled on every quiet poll until it
+    reaches ``max_idle_latency``, which bounds how long the first movement after a quiet period can go unnoticed. Any
+    movement restores the full polling rate immediately. Consumers that need closely spaced samples at all times
+    (like gesture triggers) can :py:meth:`pin_polling_rate` to keep the full rate while idle.
     """
 
-    def __init__(self, polling_frequency: int = 20):
-        self.ahk = AHK()
-        self._joystick_values: dict[str, dict[str, int | float]] = {}
+    def __init__(
+        self,
+        polling_frequency: int = 20,
+        rescan_interval: float = 5.0,
+        max_idle_latency: float | None = 0.25,
+        idle_timeout: float = 2.0,
+        activity_threshold: float = 0.5,
+        source: JoystickSource | None = None,
+        history_size: int = 64,
+    ):
+        """
+
+        :param polling_frequency: polls per second while joysticks are in use
+        :param rescan_interval: how often (in seconds) the connected joysticks are enumerated again
+        :param max_idle_latency: the longest polling interval (in seconds) used while joysticks are idle. ``None``
+          disables adaptive polling, always polling at ``polling_frequency``.
+        :param idle_timeout: how long (in seconds) nothing must change before the polling rate is lowered
+        :param activity_threshold: how much an axis value must change to count as movement; smaller changes are
+          treated as sensor noise. Any button or POV hat change counts as activity.
+        :param source: where to read joystick data from. By default, joysticks are read through a new AHK engine.
+        :param history_size: how many samples are kept for each axis whose :py:meth:`history` is requested
+        """
+        if source is None:
+            source = AHKJoystickSource()
+        self.source = source
+        self._topology: dict[str, JoystickInfo] = {}
+        self._layout = JoystickLayout(self._topology)
+        self._front = JoystickSnapshot(self._layout)
+        self._back = JoystickSnapshot(self._layout)
+        self._sequence = 0
+        self._rescan_requested = True
         self._stopped = True
         self._axis_listener: Thread | None = None
         self._polling_frequency = polling_frequency
+        self._rescan_interval = rescan_interval
+        self._max_idle_latency = max_idle_latency
+        self._idle_timeout = idle_timeout
+        self._activity_threshold = activity_threshold
+        self._polling_interval = 1 / polling_frequency
+        self._last_activity = 0.0
+        self._last_scan = 0.0
+        self._rate_pins = 0
         self._lock = Lock()
+        self._subscribers: dict[tuple[str, str], list[AxisSubscriber]] = {}
+        self._new_subscribers: list[tuple[tuple[str, str], AxisSubscriber]] = []
+        self._snapshot_subscribers: list[SnapshotSubscriber] = []
+        self._subscribers_lock = Lock()
+        self._history_size = history_size
+        self._histories: dict[tuple[str, str], AxisHistory] = {}
+        self._history_refs: dict[tuple[str, str], int] = {}
+
+    @property
+    def polling_interval(self) -> float:
+        """
+        The current time between polls, in seconds
+        """
+        return self._polling_interval
+
+    def pin_polling_rate(self) -> None:
+        """
+        Keep polling at ``polling_frequency`` even while the joysticks are idle, until a matching
+        :py:meth:`unpin_polling_rate`. Pins are counted, so several consumers can pin the rate independently.
+        """
+        with self._subscribers_lock:
+            self._rate_pins += 1
+            self._polling_interval = 1 / self._polling_frequency
+
+    def unpin_polling_rate(self) -> None:
+        with self._subscribers_lock:
+            assert self._rate_pins > 0, 'polling rate is not pinned'
+            self._rate_pins -= 1
+
+    def subscribe(self, joystick_index: int | str, axis: str, callback: AxisSubscriber) -> None:
+        """
+        Call ``callback`` with an :py:class:`~voice_commander.joy_listener.AxisEvent` whenever the value of ``axis``
+        of the given joystick changes. Callbacks run on the polling thread, so they should return quickly.
+        """
+        key = (_joystick_key(joystick_index), axis)
+        with self._subscribers_lock:
+            self._subscribers.setdefault(key, []).append(callback)
+            self._new_subscribers.append((key, callback))
+
+    def unsubscribe(self, joystick_index: int | str, axis: str, callback: AxisSubscriber) -> None:
+        key = (_joystick_key(joystick_index), axis)
+        with self._subscribers_lock:
+            callbacks = self._subscribers.get(key, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._subscribers.pop(key, None)
+            self._new_subscribers = [entry for entry in self._new_subscribers if entry != (key, callback)]
+
+    def history(self, joystick_index: int | str, axis: str) -> AxisHistory:
+        """
+        Get the sample history of an axis. From the first call on, every poll appends the axis value to it (before
+        snapshot subscribers are called), until each call has been matched by a :py:meth:`release_history`.
+        """
+        key = (_joystick_key(joystick_index), axis)
+        with self._subscribers_lock:
+            history = self._histories.get(key)
+            if history is None:
+                history = self._histories[key] = AxisHistory(self._history_size)
+            self._history_refs[key] = self._history_refs.get(key, 0) + 1
+            return history
+
+    def release_history(self, joystick_index: int | str, axis: str) -> None:
+        key = (_joystick_key(joystick_index), axis)
+        with self._subscribers_lock:
+            assert self._history_refs.get(key, 0) > 0, 'axis history is not in use'
+            self._history_refs[key] -= 1
+            if not self._history_refs[key]:
+                del self._history_refs[key]
+                del self._histories[key]
+
+    def add_snapshot_subscriber(self, callback: SnapshotSubscriber) -> None:
+        """
+        Call ``callback`` with each new :py:class:`~voice_commander.joystick_snapshot.JoystickSnapshot`, which holds
+        the states of all joysticks along with its ``timestamp`` and ``sequence``. Callbacks run on the polling thread.
+        The snapshot object is reused for later polls, so callbacks that keep it should keep a ``copy()`` instead.
+        """
+        with self._subscribers_lock:
+            self._snapshot_subscribers.append(callback)
+
+    def remove_snapshot_subscriber(self, callback: SnapshotSubscriber) -> None:
+        with self._subscribers_lock:
+            if callback in self._snapshot_subscribers:
+                self._snapshot_subscribers.remove(callback)
+
+    @property
+    def has_subscribers(self) -> bool:
+        with self._subscribers_lock:
+            return bool(self._subscribers or self._snapshot_subscribers)
+
+    @property
+    def topology(self) -> dict[str, JoystickInfo]:
+        """
+        The joysticks found by the most recent enumeration, keyed by AHK joystick index
+        """
+        return dict(self._topology)
+
+    def rescan(self) -> None:
+        """
+        Enumerate the connected joysticks again before the next poll
+        """
+        self._rescan_requested = True
+
+    @property
+    def sequence(self) -> int:
+        """
+        The sequence number of the most recently published snapshot (0 before the first poll)
+        """
+        return self._sequence
+
+    def read_snapshot(self) -> JoystickSnapshot:
+        """
+        Get a consistent copy of the most recently published snapshot
+        """
+        while True:
+            snapshot = self._front
+            sequence = snapshot.sequence
+            copy = snapshot.copy()
+            if sequence >= 0 and snapshot.sequence == sequence:
+                return copy
+
+    def get_joystick_state(self, joystick_index: int | str) -> JoystickState:
+        joystick_state = self.read_snapshot().get_state(joystick_index)
+        if joystick_state is None:
+            raise ValueError('Could not get state for joystick index {}'.format(joystick_index))
+        return joystick_state
 
     def get_joystick_axis_value(self, axis: str, joystick_index: int | str) -> float | int:
-        joystick_values = self._joystick_values.get(str(joystick_index), None)
-        if joystick_values is None:
+        while True:
+            snapshot = self._front
+            sequence = snapshot.sequence
+            joystick_slot = snapshot.layout.joystick_slot(joystick_index)
+            slot = snapshot.layout.axis_slot(joystick_index, axis)
+            axis_value = snapshot.values[slot] if slot is not None else math.nan
+            if sequence >= 0 and snapshot.sequence == sequence:
+                break
+        if joystick_slot is None:
             raise ValueError('Could not get value for joystick index {}'.format(joystick_index))
-        axis_value = joystick_values.get(axis, None)
-        if axis_value is None:
+        if math.isnan(axis_value):
             raise ValueError(f"Joystick {joystick_index} has no value for axis {axis}")
         return axis_value
 
@@ -40,6 +441,7 @@ class JoyListener:
         with self._lock:
             if self._stopped is True:
                 assert self._axis_listener is None
+                self.source.start()
                 self._stopped = False
                 self._axis_listener = Thread(target=self._listen)
                 self._axis_listener.start()
@@ -51,12 +453,111 @@ class JoyListener:
                 assert self._axis_listener is not None
                 self._axis_listener.join()
                 self._axis_listener = None
+                self.source.stop()
+
+    def _scan(self) -> None:
+        topology = self.source.enumerate()
+        if topology.keys() != self._topology.keys():
+            logger.info(f'Joysticks connected: {", ".join(topology) or "none"}')
+        if topology != self._topology:
+            self._topology = topology
+            self._layout = JoystickLayout(topology)
+        self._rescan_requested = False
+        self._last_scan = time.monotonic()
+
+    def _adapt_polling_interval(self, previous: JoystickSnapshot, snapshot: JoystickSnapshot, now: float) -> None:
+        active_interval = 1 / self._polling_frequency
+        if self._max_idle_latency is None or self._rate_pins:
+            self._polling_interval = active_interval
+            return
+        if _has_activity(previous, snapshot, self._activity_threshold):
+            self._last_activity = now
+            self._polling_interval = active_interval
+        elif now - self._last_activity >= self._idle_timeout:
+            idle_interval = max(active_interval, self._max_idle_latency)
+            self._polling_interval = min(self._polling_interval * 2, idle_interval)
 
     def _listen(self) -> None:
-        _get_all_joystick_values(self.ahk)
-        time.sleep(0.1)
+        self._rescan_requested = True
+        self._last_activity = time.monotonic()
+        self._polling_interval = 1 / self._polling_frequency
         while True:
             if self._stopped is True:
                 break
-            self._joystick_values = _get_all_joystick_values(self.ahk)
-            time.sleep(1 / self._polling_frequency)
+            poll_start = time.monotonic()
+            snapshot = self._back
+            try:
+                if self._rescan_requested or poll_start - self._last_scan >= self._rescan_interval:
+                    self._scan()
+                if snapshot.layout is not self._layout:
+                    snapshot = JoystickSnapshot(self._layout)
+                # Readers still holding this buffer from two polls ago will notice it is being rewritten
+                snapshot.sequence = -1
+                success = self.source.read(snapshot)
+            except Exception:
+                # Keep polling; the source may recover (e.g., once an engine becomes available again)
+                logger.exception('Error polling joysticks')
+                success = False
+            if success:
+                now = time.monotonic()
+                if not self.source.timestamped:
+                    snapshot.timestamp = now
+                self._sequence += 1
+                snapshot.sequence = self._sequence
+                previous = self._front
+                self._front, self._back = snapshot, previous
+                self._publish(previous, snapshot)
+                self._adapt_polling_interval(previous, snapshot, now)
+            else:
+                # The buffer may be partly filled, or still hold the values of two polls ago; publishing it would
+                # make axes jump back to old values
+                logger.info('Joystick read failed; enumerating joysticks again')
+                self._rescan_requested = True
+            if self.source.exhausted:
+                logger.info('Joystick source exhausted; no longer polling')
+                break
+            if not self.source.paced:
+                # The time spent reading counts towards the interval, so the interval bounds the latency
+                time.sleep(max(0.0, poll_start + self._polling_interval - time.monotonic()))
+
+    def _publish(self, previous: JoystickSnapshot, snapshot: JoystickSnapshot) -> None:
+        deliveries: list[tuple[AxisSubscriber, AxisEvent]] = []
+        timestamp = snapshot.timestamp
+        with self._subscribers_lock:
+            snapshot_subscribers = list(self._snapshot_subscribers)
+            for (joystick, axis), history in self._histories.items():
+                value = snapshot.get_axis_value(joystick, axis)
+                if value is not None:
+                    history.append(timestamp, value)
+        for snapshot_subscriber in snapshot_subscribers:
+            try:
+                snapshot_subscriber(snapshot)
+            except Exception:
+                logger.exception('Error in joystick snapshot subscriber')
+        with self._subscribers_lock:
+            if not self._subscribers:
+                return
+            pending = []
+            initialized: list[tuple[tuple[str, str], AxisSubscriber]] = []
+            for key, callback in self._new_subscribers:
+                joystick, axis = key
+                value = snapshot.get_axis_value(joystick, axis)
+                if value is None:
+                    # Not available (yet); keep waiting for the joystick to show up
+                    pending.append((key, callback))
+                    continue
+                initialized.append((key, callback))
+                deliveries.append((callback, AxisEvent(joystick, axis, value, timestamp)))
+            self._new_subscribers = pending
+            for key, callbacks in self._subscribers.items():
+                joystick, axis = key
+                value = snapshot.get_axis_value(joystick, axis)
+                if value is None or value == previous.get_axis_value(joystick, axis):
+                    continue
+                event = AxisEvent(joystick, axis, value, timestamp)
+                deliveries.extend((callback, event) for callback in callbacks if (key, callback) not in initialized)
+        for callback, event in deliveries:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception(f'Error in subscriber for joystick {event.joystick} axis {event.axis}')
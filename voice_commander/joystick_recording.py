@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+import sys
+import threading
+import time
+from array import array
+from types import TracebackType
+from typing import Any
+from typing import BinaryIO
+
+import numpy as np
+import numpy.typing as npt
+
+from ._utils import get_logger
+from ._utils import JoystickInfo
+from .joy_listener import JoystickSource
+from .joystick_snapshot import JoystickLayout
+from .joystick_snapshot import JoystickSnapshot
+
+logger = get_logger()
+
+# File layout: magic, format version, length of the JSON header, the JSON header (joystick topology and byte order),
+# then fixed-size records of: capture timestamp (float64), sequence number (uint64), one float32 per axis of the
+# layout, one uint64 button bitmask per joystick.
+_MAGIC = b'VCJOYREC'
+_VERSION = 1
+_preamble = struct.Struct('<8sHI')
+
+
+class JoystickRecorder:
+    """
+    Writes :py:class:`~voice_commander.joystick_snapshot.JoystickSnapshot` objects to a compact binary file.
+
+    The recording uses the layout of the first snapshot; later snapshots with a different layout (e.g., after a
+    joystick was connected) are mapped onto it, with NaN for axes that are missing. Use it as a snapshot subscriber::
+
+        recorder = JoystickRecorder('session.vcjoy')
+        get_joy_listener().add_snapshot_subscriber(recorder.record)
+    """
+
+    def __init__(self, path: str, flush_every: int = 256):
+        """
+
+        :param path: the file to write to (overwritten if it exists)
+        :param flush_every: how many records are buffered before they are written to the file
+        """
+        self.path = path
+        self._file: BinaryIO = open(path, 'wb')
+        self._flush_every = flush_every
+        self._layout: JoystickLayout | None = None
+        self._buffer = bytearray()
+        self._buffered = 0
+        self._count = 0
+        self._remap_layout: JoystickLayout | None = None
+        self._remap: npt.NDArray[np.intp] = np.zeros(0, dtype=np.intp)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _write_header(self, layout: JoystickLayout) -> None:
+        header = json.dumps(
+            {
+                'byteorder': sys.byteorder,
+                'topology': {
+                    joystick: {'axes': list(info.axes), 'button_count': info.button_count}
+                    for joystick, info in layout.topology.items()
+                },
+            }
+        ).encode('utf-8')
+        self._file.write(_preamble.pack(_MAGIC, _VERSION, len(header)))
+        self._file.write(header)
+
+    def _values_for(self, snapshot: JoystickSnapshot) -> tuple[array[float], array[int]]:
+        assert self._layout is not None
+        if snapshot.layout is self._layout:
+            return snapshot.values, snapshot.buttons
+        if self._remap_layout is not snapshot.layout:
+            missing = len(snapshot.layout)
+            self._remap = np.array(
+                [
+                    slot if (slot := snapshot.layout.axis_slot(*key)) is not None else missing
+                    for key in self._layout.axes
+                ],
+                dtype=np.intp,
+            )
+            self._remap_layout = snapshot.layout
+        values = np.append(snapshot.as_numpy(), np.float32(np.nan))[self._remap]
+        buttons = array('Q', self._layout.blank_buttons)
+        for slot, joystick in enumerate(self._layout.joysticks):
+            source_slot = snapshot.layout.joystick_slot(joystick)
+            if source_slot is not None:
+                buttons[slot] = snapshot.buttons[source_slot]
+        return array('f', values.tobytes()), buttons
+
+    def record(self, snapshot: JoystickSnapshot) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            if self._layout is None:
+                self._layout = snapshot.layout
+                self._write_header(snapshot.layout)
+            values, buttons = self._values_for(snapshot)
+            self._buffer += struct.pack('=dQ', snapshot.timestamp, snapshot.sequence)
+            self._buffer += values.tobytes()
+            self._buffer += buttons.tobytes()
+            self._buffered += 1
+            self._count += 1
+            if self._buffered >= self._flush_every:
+                self._flush()
+
+    def _flush(self) -> None:
+        self._file.write(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            if self._layout is None:
+                self._write_header(JoystickLayout({}))
+            self._flush()
+            self._file.close()
+
+    def __enter__(self) -> JoystickRecorder:
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc_val: BaseException | None, exc_tb: TracebackType | None
+    ) -> None:
+        self.close()
+
+
+class JoystickRecording:
+    """
+    A recording made by :py:class:`~voice_commander.joystick_recording.JoystickRecorder`, memory-mapped for reading.
+
+    ``records`` is a NumPy structured array (a view of the file) with the fields ``timestamp``, ``sequence``,
+    ``values`` (one column per axis of ``layout``) and ``buttons`` (one column per joystick of ``layout``).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = _preamble.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f'{path!r} is not a joystick recording')
+        if version != _VERSION:
+            raise ValueError(f'Unsupported joystick recording version: {version!r}')
+        offset = _preamble.size + header_length
+        header_start = _preamble.size
+        header: dict[str, Any] = json.loads(self._mmap[header_start:offset])
+        topology = {
+            joystick: JoystickInfo(axes=tuple(info['axes']), button_count=info['button_count'])
+            for joystick, info in header['topology'].items()
+        }
+        self.layout = JoystickLayout(topology)
+        order = '<' if header['byteorder'] == 'little' else '>'
+        self._dtype = np.dtype(
+            [
+                ('timestamp', f'{order}f8'),
+                ('sequence', f'{order}u8'),
+                ('values', f'{order}f4', (len(self.layout.axes),)),
+                ('buttons', f'{order}u8', (len(self.layout.joysticks),)),
+            ]
+        )
+        count = (len(self._mmap) - offset) // self._dtype.itemsize
+        self.records: npt.NDArray[np.void] = np.frombuffer(self._mmap, dtype=self._dtype, count=count, offset=offset)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def timestamps(self) -> npt.NDArray[np.float64]:
+        return self.records['timestamp'].astype(np.float64)
+
+    @property
+    def duration(self) -> float:
+        if not len(self.records):
+            return 0.0
+        return float(self.records['timestamp'][-1] - self.records['timestamp'][0])
+
+    def snapshot(self, index: int) -> JoystickSnapshot:
+        snapshot = JoystickSnapshot(self.layout)
+        self.fill(snapshot, index)
+        record = self.records[index]
+        snapshot.timestamp = float(record['timestamp'])
+        snapshot.sequence = int(record['sequence'])
+        return snapshot
+
+    def fill(self, snapshot: JoystickSnapshot, index: int) -> None:
+        """
+        Overwrite the axis values and buttons of ``snapshot`` (which must use a layout equal to this recording's)
+        with those of record ``index``
+        """
+        record = self.records[index]
+        snapshot.as_numpy()[:] = record['values']
+        np.frombuffer(snapshot.buttons, dtype=np.uint64)[:] = record['buttons']
+
+    def close(self) -> None:
+        # The records array is a view of the mapping; drop it first so the mapping can be closed
+        self.records = np.zeros(0, dtype=self._dtype)
+        self._mmap.close()
+
+    def __enter__(self) -> JoystickRecording:
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc_val: BaseException | None, exc_tb: TracebackType | None
+    ) -> None:
+        self.close()
+
+
+class ReplaySource(JoystickSource):
+    """
+    Feeds a :py:class:`~voice_commander.joystick_recording.JoystickRecording` to a
+    :py:class:`~voice_commander.joy_listener.JoyListener` in place of real joysticks, e.g.
+    ``JoyListener(source=ReplaySource(JoystickRecording('session.vcjoy'), speed=10))``.
+
+    Every record is delivered exactly once, in order. Records are spaced as they were recorded, divided by ``speed``;
+    with ``speed=None`` they are delivered as fast as the listener can process them. Snapshots carry the timestamps
+    of the recording (shifted forward on every pass when looping), so time-based triggers see the movements as they
+    were recorded, regardless of the replay speed.
+
+    Availability: all platforms
+    """
+
+    paced = True
+    timestamped = True
+
+    def __init__(self, recording: JoystickRecording, speed: float | None = 1.0, loop: bool = False):
+        """
+
+        :param recording: the recording to replay
+        :param speed: the replay speed relative to real time, or ``None`` for no delays at all
+        :param loop: start over at the beginning of the recording after the last record instead of finishing
+        """
+        assert speed is None or speed > 0
+        self.recording = recording
+        self.speed = speed
+        self.loop = loop
+        self.finished = threading.Event()
+        self._position = 0
+        self._start: float | None = None
+        self._first_timestamp = 0.0
+        # Added to the recorded timestamps, so they keep increasing when looping
+        self._time_offset = 0.0
+
+    @property
+    def position(self) -> int:
+        """
+        The number of records delivered so far (in the current pass, when looping)
+        """
+        return self._position
+
+    @property
+    def exhausted(self) -> bool:
+        return self.finished.is_set()
+
+    def enumerate(self) -> dict[str, JoystickInfo]:
+        return dict(self.recording.layout.topology)
+
+    def read(self, snapshot: JoystickSnapshot) -> bool:
+        records = self.recording.records
+        if not len(records):
+            self.finished.set()
+            return True
+        if self._start is None:
+            self._start = time.monotonic()
+            self._first_timestamp = float(records['timestamp'][0])
+        if self.speed is not None:
+            due = self._start + (float(records['timestamp'][self._position]) - self._first_timestamp) / self.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.recording.fill(snapshot, self._position)
+        timestamp = float(records['timestamp'][self._position])
+        snapshot.timestamp = timestamp + self._time_offset
+        self._position += 1
+        if self._position >= len(records):
+            if self.loop:
+                # The next pass starts one average record interval after this one ended
+                interval = self.recording.duration / (len(records) - 1) if len(records) > 1 else 0.0
+                self._time_offset += timestamp - self._first_timestamp + interval
+                self._position = 0
+                self._start = None
+            else:
+                self.finished.set()
+        # Records are always complete; NaN values are axes that were missing when the record was captured
+        return True
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import json
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+from types import TracebackType
+
+import numpy as np
+import numpy.typing as npt
+
+from ._utils import get_logger
+from ._utils import JoystickInfo
+from .joy_listener import JoystickSource
+from .joystick_snapshot import JoystickLayout
+from .joystick_snapshot import JoystickSnapshot
+
+logger = get_logger()
+
+DEFAULT_NAME = 'voice_commander_joystick'
+
+_MAGIC = b'VCJOYSHM'
+_VERSION = 1
+_MAX_JOYSTICKS = 16
+_MAX_AXES = _MAX_JOYSTICKS * 7  # X, Y, Z, R, U, V and POV
+_TOPOLOGY_CAPACITY = 4096
+
+# Region layout. The header holds the seqlock counter (odd while the publisher is writing), a layout version which
+# changes whenever the joystick topology changes, the capture timestamp and listener sequence number of the snapshot,
+# and the sizes of the data that follows: the topology as JSON, one float32 per axis and one uint64 button bitmask per
+# joystick.
+_preamble = struct.Struct('<8sII')  # magic, version, topology capacity
+_SEQLOCK_OFFSET = 16
+_seqlock = struct.Struct('<Q')
+_DATA_OFFSET = 24
+# layout version, timestamp, sequence, axis count, joystick count, topology length
+_data_header = struct.Struct('<QdQIII')
+_TOPOLOGY_OFFSET = 64
+_VALUES_OFFSET = _TOPOLOGY_OFFSET + _TOPOLOGY_CAPACITY
+_BUTTONS_OFFSET = _VALUES_OFFSET + _MAX_AXES * 4
+_SIZE = _BUTTONS_OFFSET + _MAX_JOYSTICKS * 8
+
+
+def _encode_topology(topology: dict[str, JoystickInfo]) -> bytes:
+    return json.dumps(
+        {joystick: {'axes': list(info.axes), 'button_count': info.button_count} for joystick, info in topology.items()}
+    ).encode('utf-8')
+
+
+def _decode_topology(data: bytes) -> dict[str, JoystickInfo]:
+    return {
+        joystick: JoystickInfo(axes=tuple(info['axes']), button_count=info['button_count'])
+        for joystick, info in json.loads(data or b'{}').items()
+    }
+
+
+class SharedJoystickPublisher:
+    """
+    Publishes joystick snapshots into a named shared memory region, so other processes can use them (through
+    :py:class:`~voice_commander.joystick_shm.SharedMemorySource`) instead of polling the joysticks themselves.
+
+    Writes are guarded by a seqlock: the counter in the header is odd while a snapshot is being written, so readers
+    can detect and retry torn reads without any locking between processes. Use it as a snapshot subscriber::
+
+        publisher = SharedJoystickPublisher()
+        get_joy_listener().add_snapshot_subscriber(publisher.publish)
+    """
+
+    def __init__(self, name: str = DEFAULT_NAME):
+        """
+
+        :param name: the name of the shared memory region; readers must use the same name
+        """
+        self.name = name
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=_SIZE)
+        buf = self._shm.buf
+        assert buf is not None
+        _preamble.pack_into(buf, 0, _MAGIC, _VERSION, _TOPOLOGY_CAPACITY)
+        _seqlock.pack_into(buf, _SEQLOCK_OFFSET, 0)
+        _data_header.pack_into(buf, _DATA_OFFSET, 0, 0.0, 0, 0, 0, 0)
+        self._values: npt.NDArray[np.float32] = np.ndarray(
+            (_MAX_AXES,), dtype=np.float32, buffer=buf, offset=_VALUES_OFFSET
+        )
+        self._buttons: npt.NDArray[np.uint64] = np.ndarray(
+            (_MAX_JOYSTICKS,), dtype=np.uint64, buffer=buf, offset=_BUTTONS_OFFSET
+        )
+        self._sequence = 0
+        self._layout: JoystickLayout | None = None
+        self._layout_version = 0
+        self._topology_length = 0
+
+    def publish(self, snapshot: JoystickSnapshot) -> None:
+        buf = self._shm.buf
+        if buf is None:
+            return
+        layout = snapshot.layout
+        if len(layout.axes) > _MAX_AXES or len(layout.joysticks) > _MAX_JOYSTICKS:
+            logger.warning('Joystick layout too large for shared memory; not publishing')
+            return
+        self._sequence += 1
+        _seqlock.pack_into(buf, _SEQLOCK_OFFSET, self._sequence * 2 - 1)
+        if layout is not self._layout:
+            topology = _encode_topology(layout.topology)
+            if len(topology) > _TOPOLOGY_CAPACITY:
+                raise ValueError('Joystick topology too large for shared memory')
+            topology_end = _TOPOLOGY_OFFSET + len(topology)
+            buf[_TOPOLOGY_OFFSET:topology_end] = topology
+            self._layout = layout
+            self._layout_version += 1
+            self._topology_length = len(topology)
+        n_axes = len(layout.axes)
+        n_joysticks = len(layout.joysticks)
+        self._values[:n_axes] = snapshot.as_numpy()
+        self._buttons[:n_joysticks] = np.frombuffer(snapshot.buttons, dtype=np.uint64)
+        _data_header.pack_into(
+            buf,
+            _DATA_OFFSET,
+            self._layout_version,
+            snapshot.timestamp,
+            snapshot.sequence,
+            n_axes,
+            n_joysticks,
+            self._topology_length,
+        )
+        _seqlock.pack_into(buf, _SEQLOCK_OFFSET, self._sequence * 2)
+
+    def close(self) -> None:
+        """
+        Stop publishing and remove the shared memory region
+        """
+        if self._shm.buf is None:
+            return
+        # release the views of the region before closing it
+        del self._values
+        del self._buttons
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> SharedJoystickPublisher:
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc_val: BaseException | None, exc_tb: TracebackType | None
+    ) -> None:
+        self.close()
+
+
+class SharedMemorySource(JoystickSource):
+    """
+    Reads joystick snapshots published by a :py:class:`~voice_commander.joystick_shm.SharedJoystickPublisher` in
+    another process, e.g. ``JoyListener(source=SharedMemorySource())``. The publishing process does all the polling.
+
+    Reads wait for the publisher to publish a new snapshot (watching the seqlock counter), so the listener delivers
+    each published snapshot once, at the publisher's pace, and snapshots keep the timestamps the publisher captured
+    them at. If nothing is published for ``wait_timeout`` seconds, the last snapshot is delivered again, so the
+    listener can notice when it is being stopped.
+
+    Availability: all platforms
+    """
+
+    paced = True
+    timestamped = True
+
+    def __init__(
+        self,
+        name: str = DEFAULT_NAME,
+        max_retries: int = 1000,
+        wait_timeout: float = 0.25,
+        check_interval: float = 0.001,
+    ):
+        """
+
+        :param name: the name of the shared memory region used by the publisher
+        :param max_retries: how often a read is retried while the publisher is writing, before giving up on it
+        :param wait_timeout: the longest time (in seconds) a read waits for a new snapshot
+        :param check_interval: how often (in seconds) the seqlock counter is checked for a new snapshot
+        """
+        self.name = name
+        self._shm = shared_memory.SharedMemory(name=name)
+        if sys.platform != 'win32':
+            # Only the publisher owns the region; don't let this process' resource tracker remove it on exit
+            resource_tracker.unregister(self._shm._name, 'shared_memory')  # type: ignore[attr-defined]
+        buf = self._shm.buf
+        assert buf is not None
+        magic, version, topology_capacity = _preamble.unpack_from(buf, 0)
+        if magic != _MAGIC or version != _VERSION or topology_capacity != _TOPOLOGY_CAPACITY:
+            self._shm.close()
+            raise ValueError(f'Shared memory region {name!r} does not hold joystick snapshots')
+        self._max_retries = max_retries
+        self._wait_timeout = wait_timeout
+        self._check_interval = check_interval
+        self._layout_version = 0
+        self._timestamp = 0.0
+        # The seqlock counter of the most recently read snapshot
+        self._counter = -1
+
+    @property
+    def age(self) -> float:
+        """
+        Seconds since the most recently read snapshot was captured by the publisher
+        """
+        return time.monotonic() - self._timestamp
+
+    def _read_consistent(
+        self, with_topology: bool
+    ) -> tuple[int, tuple[int, float, int, int, int, int], bytes, bytes] | None:
+        buf = self._shm.buf
+        assert buf is not None
+        for _ in range(self._max_retries):
+            (before,) = _seqlock.unpack_from(buf, _SEQLOCK_OFFSET)
+            if before % 2:
+                continue
+            header = _data_header.unpack_from(buf, _DATA_OFFSET)
+            _, _, _, n_axes, n_joysticks, topology_length = header
+            topology_end = _TOPOLOGY_OFFSET + topology_length
+            topology = bytes(buf[_TOPOLOGY_OFFSET:topology_end]) if with_topology else b''
+            values_end = _VALUES_OFFSET + n_axes * 4
+            buttons_end = _BUTTONS_OFFSET + n_joysticks * 8
+            data = bytes(buf[_VALUES_OFFSET:values_end]) + bytes(buf[_BUTTONS_OFFSET:buttons_end])
+            (after,) = _seqlock.unpack_from(buf, _SEQLOCK_OFFSET)
+            if before == after:
+                return before, header, topology, data
+        logger.warning('Could not get a consistent joystick snapshot from shared memory')
+        return None
+
+    def enumerate(self) -> dict[str, JoystickInfo]:
+        result = self._read_consistent(with_topology=True)
+        if result is None:
+            return {}
+        _, header, topology, _ = result
+        self._layout_version = header[0]
+        return _decode_topology(topology)
+
+    def _wait_for_snapshot(self) -> None:
+        buf = self._shm.buf
+        assert buf is not None
+        deadline = time.monotonic() + self._wait_timeout
+        while _seqlock.unpack_from(buf, _SEQLOCK_OFFSET)[0] == self._counter and time.monotonic() < deadline:
+            time.sleep(self._check_interval)
+
+    def read(self, snapshot: JoystickSnapshot) -> bool:
+        self._wait_for_snapshot()
+        result = self._read_consistent(with_topology=False)
+        if result is None:
+            return False
+        self._counter, (layout_version, timestamp, _, n_axes, n_joysticks, _), _, data = result
+        snapshot.timestamp = timestamp
+        if layout_version != self._layout_version or n_axes != len(snapshot.layout.axes):
+            # The publisher's joysticks changed; the listener will enumerate again, and the next read should not wait
+            # for yet another snapshot
+            self._counter = -1
+            return False
+        values_size = n_axes * 4
+        snapshot.as_numpy()[:] = np.frombuffer(data, dtype=np.float32, count=n_axes)
+        np.frombuffer(snapshot.buttons, dtype=np.uint64)[:] = np.frombuffer(
+            data, dtype=np.uint64, count=n_joysticks, offset=values_size
+        )
+        self._timestamp = timestamp
+        return not bool(np.isnan(snapshot.as_numpy()).any())
+
+    def close(self) -> None:
+        self._shm.close()
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import math
+import time
+from array import array
+
+import numpy as np
+import numpy.typing as npt
+
+from ._utils import JoystickInfo
+from ._utils import JoystickState
+
+
+class JoystickLayout:
+    """
+    A fixed assignment of every (joystick, axis) pair of a joystick topology to a position in a
+    :py:class:`~voice_commander.joystick_snapshot.JoystickSnapshot`
+    """
+
+    def __init__(self, topology: dict[str, JoystickInfo]):
+        self.topology = dict(topology)
+        self.joysticks: tuple[str, ...] = tuple(topology)
+        self.axes: tuple[tuple[str, str], ...] = tuple(
+            (joystick, axis) for joystick, info in topology.items() for axis in info.axes
+        )
+        self._axis_slots = {key: slot for slot, key in enumerate(self.axes)}
+        self._joystick_slots = {joystick: slot for slot, joystick in enumerate(self.joysticks)}
+        self.blank_values = array('f', [math.nan]) * len(self.axes)
+        self.blank_buttons = array('Q', [0]) * len(self.joysticks)
+        self.pov_mask: npt.NDArray[np.bool_] = np.array([axis == 'POV' for _, axis in self.axes], dtype=np.bool_)
+
+    def __len__(self) -> int:
+        return len(self.axes)
+
+    def axis_slot(self, joystick_index: int | str, axis: str) -> int | None:
+        return self._axis_slots.get((str(joystick_index) or '1', axis))
+
+    def joystick_slot(self, joystick_index: int | str) -> int | None:
+        return self._joystick_slots.get(str(joystick_index) or '1')
+
+
+class JoystickSnapshot:
+    """
+    The state of all joysticks of a :py:class:`~voice_commander.joystick_snapshot.JoystickLayout` at one point in time.
+
+    Axis values are stored in an ``array('f')`` (NaN where a value could not be read) and pressed buttons as one
+    bitmask per joystick in an ``array('Q')``. ``sequence`` increases with every published snapshot and
+    ``timestamp`` is the ``time.monotonic()`` time the values were read.
+    """
+
+    def __init__(self, layout: JoystickLayout):
+        self.layout = layout
+        self.values = array('f', layout.blank_values)
+        self.buttons = array('Q', layout.blank_buttons)
+        self.sequence = 0
+        self.timestamp = 0.0
+
+    @property
+    def age(self) -> float:
+        """
+        Seconds since the values were read
+        """
+        return time.monotonic() - self.timestamp
+
+    def is_stale(self, max_age: float) -> bool:
+        return self.age > max_age
+
+    def copy(self) -> JoystickSnapshot:
+        snapshot = JoystickSnapshot.__new__(JoystickSnapshot)
+        snapshot.layout = self.layout
+        snapshot.values = array('f', self.values)
+        snapshot.buttons = array('Q', self.buttons)
+        snapshot.sequence = self.sequence
+        snapshot.timestamp = self.timestamp
+        return snapshot
+
+    def as_numpy(self) -> npt.NDArray[np.float32]:
+        """
+        The axis values as a NumPy array (a view; no copy is made)
+        """
+        return np.frombuffer(self.values, dtype=np.float32)
+
+    def get_axis_value(self, joystick_index: int | str, axis: str) -> float | None:
+        slot = self.layout.axis_slot(joystick_index, axis)
+        if slot is None:
+            return None
+        value = self.values[slot]
+        return None if math.isnan(value) else value
+
+    def is_pressed(self, joystick_index: int | str, button: int) -> bool:
+        slot = self.layout.joystick_slot(joystick_index)
+        if slot is None:
+            return False
+        return bool(self.buttons[slot] >> (button - 1) & 1)
+
+    def get_state(self, joystick_index: int | str) -> JoystickState | None:
+        joystick = str(joystick_index) or '1'
+        slot = self.layout.joystick_slot(joystick)
+        if slot is None:
+            return None
+        axes: dict[str, int | float] = {}
+        for axis in self.layout.topology[joystick].axes:
+            value = self.get_axis_value(joystick, axis)
+            if value is not None:
+                axes[axis] = value
+        return JoystickState(
+            axes=axes, buttons=self.buttons[slot], button_count=self.layout.topology[joystick].button_count
+        )
+
+    def fill(self, payload: str) -> bool:
+        """
+        Overwrite the values with a joystick read payload from the AHK engine (see ``_utils._joystick_script``).
+
+        :return: whether every axis of the layout was read; axes which were not are set to NaN
+        """
+        layout = self.layout
+        values = self.values
+        # Start from all NaN (a C-level copy) so no value from an earlier read survives if something went missing
+        values[:] = layout.blank_values
+        self.buttons[:] = layout.blank_buttons
+        read = 0
+        for line in payload.splitlines():
+            if not line:
+                continue
+            joystick, _, buttons, axis_values = line.split('|')
+            joystick_slot = layout.joystick_slot(joystick)
+            if joystick_slot is None:
+                continue
+            self.buttons[joystick_slot] = int(buttons)
+            for item in axis_values.split(','):
+                if not item:
+                    continue
+                axis, _, value = item.partition('=')
+                slot = layout.axis_slot(joystick, axis)
+                if slot is not None:
+                    values[slot] = float(value)
+                    read += 1
+        return read == len(layout.axes)
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition
+from threading import Lock
+from threading import Thread
+
+from ._utils import get_ahk_pool
+from ._utils import get_logger
+from .cancellation import CancellationToken
+from .engine_pool import EngineRole
+
+logger = get_logger()
+
+
+def _send(keys: str) -> None:
+    with get_ahk_pool().lease(EngineRole.INPUT) as engine:
+        engine.send(keys)
+
+
+class KeyTimingScheduler:
+    """
+    Runs timed key events (like the key down and key up of a press) from a single timing thread, so waiting for them
+    does not tie up a thread per press.
+
+    Events are kept in a heap ordered by due time (``time.perf_counter()``). The timing thread sleeps until shortly
+    before the next event is due and busy-waits for the last ``spin_threshold`` seconds, which makes events fire
+    within a fraction of a millisecond of their due time regardless of the granularity of ``time.sleep``. The events
+    themselves (sending keys) run on a small worker pool, so a slow engine call never delays other events.
+    """
+
+    def __init__(self, spin_threshold: float = 0.002, max_workers: int = 4):
+        """
+
+        :param spin_threshold: how long before an event is due the timing thread stops sleeping and busy-waits
+        :param max_workers: the number of threads running due events
+        """
+        self._spin_threshold = spin_threshold
+        self._heap: list[tuple[float, int, Callable[[], None]]] = []
+        self._counter = itertools.count()
+        self._condition = Condition()
+        self._thread: Thread | None = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='key-timing-worker')
+
+    def _schedule(self, due: float, callback: Callable[[], None]) -> None:
+        # ``callback`` runs on the timing thread and must return quickly
+        with self._condition:
+            heapq.heappush(self._heap, (due, next(self._counter), callback))
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='key-timing-scheduler', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                due = self._heap[0][0]
+                remaining = due - time.perf_counter()
+                if remaining > self._spin_threshold:
+                    self._condition.wait(remaining - self._spin_threshold)
+                    continue
+                _, _, callback = heapq.heappop(self._heap)
+            while time.perf_counter() < due:
+                pass
+            try:
+                callback()
+            except Exception:
+                logger.exception('Error in key timing callback')
+
+    def call_at(self, due: float, function: Callable[[], None]) -> Future[None]:
+        """
+        Call ``function`` on a worker thread at ``due`` (a ``time.perf_counter()`` time; past times run immediately).
+
+        :return: a future which completes when ``function`` has returned
+        """
+        future: Future[None] = Future()
+
+        def run() -> None:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                function()
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+        def submit() -> None:
+            self._executor.submit(run)
+
+        self._schedule(due, submit)
+        return future
+
+    def press(
+        self, key: str, hold: float = 0.1, gap: float = 0.1, token: CancellationToken | None = None
+    ) -> Future[None]:
+        """
+        Press and release ``key`` through the AHK input engines without blocking the caller.
+
+        :param key: the key to press, without braces
+        :param hold: how long the key is held down, in seconds
+        :param gap: how long to wait after releasing the key before the press counts as completed, in seconds
+        :param token: when cancelled, the key is released right away (or not pressed at all) and the gap is skipped
+        :return: a future which completes ``gap`` seconds after the key was released
+        """
+        done: Future[None] = Future()
+        start = time.perf_counter()
+        lock = Lock()
+        pressed_down = False
+        released = False
+
+        def press_down() -> None:
+            nonlocal pressed_down, released
+            with lock:
+                if released or (token is not None and token.cancelled):
+                    released = True
+                    return
+                _send(f'{{Blind}}{{{key} DOWN}}')
+                pressed_down = True
+
+        def release() -> None:
+            # Runs at the end of the hold time, and right away if the token is cancelled; whichever comes first wins
+            nonlocal released
+            with lock:
+                if released:
+                    return
+                released = True
+                if pressed_down:
+                    _send(f'{{Blind}}{{{key} UP}}')
+
+        def finish(error: BaseException | None = None) -> None:
+            with lock:
+                if done.done():
+                    return
+                if error is not None:
+                    done.set_exception(error)
+                else:
+                    done.set_result(None)
+            if token is not None:
+                token.remove_callback(on_cancel)
+
+        def on_released(release_done: Future[None]) -> None:
+            error = release_done.exception()
+            if error is not None or (token is not None and token.cancelled):
+                finish(error)
+                return
+            self._schedule(start + hold + gap, finish)
+
+        def on_pressed(press_done: Future[None]) -> None:
+            error = press_done.exception()
+            if error is not None:
+                finish(error)
+                return
+            # If sending the key down took longer than the hold time, the key is released right away
+            self.call_at(start + hold, release).add_done_callback(on_released)
+
+        def on_cancel() -> None:
+            self.call_at(0.0, release).add_done_callback(on_released)
+
+        if token is not None:
+            token.add_callback(on_cancel)
+        self.call_at(start, press_down).add_done_callback(on_pressed)
+        return done
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import enum
+import time
+from collections import deque
+from collections.abc import Callable
+from threading import Lock
+from typing import NamedTuple
+
+from ._utils import get_logger
+
+logger = get_logger()
+
+
+class OverflowPolicy(enum.StrEnum):
+    """
+    What a :py:class:`~voice_commander.match_queue.MatchQueue` does with a new match when it cannot simply be queued
+    """
+
+    DROP_NEWEST = 'drop_newest'  # When full, the new match is discarded
+    DROP_OLDEST = 'drop_oldest'  # When full, the oldest pending match is discarded to make room for the new one
+    COALESCE = 'coalesce'  # Matches arriving within the coalesce window of the last accepted match are discarded. When full, like DROP_NEWEST
+    LATEST_WINS = 'latest_wins'  # Only the most recent match is kept pending; older pending matches are discarded
+
+
+class MatchQueueStats(NamedTuple):
+    depth: int
+    accepted: int
+    dropped: int
+    in_flight: int
+
+
+class MatchQueue:
+    """
+    Bounded queue of pending matches for a single trigger.
+
+    Keeps repeated utterances from piling up (and replaying long after they were spoken) while a trigger's actions
+    are slow to complete.
+
+    With ``max_in_flight`` set, matches are only handed out while fewer than that many matches taken from the queue
+    are still being handled (the consumer reports each one finished with :py:meth:`task_done`). Until then, further
+    matches stay pending here, where ``maxsize`` and the overflow policy apply to them.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 3,
+        policy: OverflowPolicy | str = OverflowPolicy.DROP_NEWEST,
+        coalesce_window: float = 0.5,
+        max_in_flight: int | None = None,
+    ):
+        """
+
+        :param maxsize: the maximum number of pending matches
+        :param policy: one of :py:class:`~voice_commander.match_queue.OverflowPolicy`
+        :param coalesce_window: for the ``COALESCE`` policy, the time (in seconds) after an accepted match during
+          which further matches are considered duplicates
+        :param max_in_flight: the maximum number of matches taken but not yet marked done; ``None`` for no limit
+        """
+        assert maxsize >= 1
+        self.maxsize = maxsize
+        self.policy = OverflowPolicy(policy)
+        self.coalesce_window = coalesce_window
+        self.max_in_flight = max_in_flight
+        #: called (without arguments) when a pending match can be taken again after :py:meth:`task_done`
+        self.on_ready: Callable[[], None] | None = None
+        self._in_flight = 0
+        self._pending: deque[str] = deque()
+        self._lock = Lock()
+        self._last_accepted: float | None = None
+        self._accepted = 0
+        self._dropped = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def stats(self) -> MatchQueueStats:
+        with self._lock:
+            return MatchQueueStats(
+                depth=len(self._pending), accepted=self._accepted, dropped=self._dropped, in_flight=self._in_flight
+            )
+
+    def put(self, value: str) -> bool:
+        """
+        Offer a new match to the queue.
+
+        :return: whether the match was queued
+        """
+        now = time.monotonic()
+        with self._lock:
+            dropped = 0
+            if self.policy is OverflowPolicy.LATEST_WINS:
+                dropped = len(self._pending)
+                self._pending.clear()
+            elif self.policy is OverflowPolicy.COALESCE and (
+                self._last_accepted is not None and now - self._last_accepted < self.coalesce_window
+            ):
+                self._dropped += 1
+                logger.debug(f'Coalescing duplicate match {value!r}')
+                return False
+            elif len(self._pending) >= self.maxsize:
+                if self.policy is OverflowPolicy.DROP_OLDEST:
+                    self._pending.popleft()
+                    dropped = 1
+                else:
+                    self._dropped += 1
+                    logger.info(f'Match queue full; dropping match {value!r}')
+                    return False
+            if dropped:
+                self._dropped += dropped
+                logger.info(f'Discarding {dropped} stale pending match(es)')
+            self._pending.append(value)
+            self._accepted += 1
+            self._last_accepted = now
+            return True
+
+    def get_nowait(self) -> str | None:
+        """
+        Take the oldest pending match, if any and if ``max_in_flight`` allows it.
+        """
+        with self._lock:
+            if not self._pending or not self._has_capacity():
+                return None
+            if self.max_in_flight is not None:
+                self._in_flight += 1
+            return self._pending.popleft()
+
+    def _has_capacity(self) -> bool:
+        # must be called with the lock held
+        return self.max_in_flight is None or self._in_flight < self.max_in_flight
+
+    def task_done(self) -> None:
+        """
+        Report that a match taken from the queue has been handled, so the next pending match can be taken.
+        """
+        with self._lock:
+            self._in_flight = max(self._in_flight - 1, 0)
+            ready = bool(self._pending) and self._has_capacity()
+        if ready and self.on_ready is not None:
+            self.on_ready()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
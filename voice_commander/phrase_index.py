@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import heapq
+import re
+from collections import Counter
+from collections.abc import Iterator
+from collections.abc import Sequence
+from functools import partial
+from typing import TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+from rapidfuzz import fuzz
+from rapidfuzz import process as rapid_process
+from thefuzz import process  # type: ignore[import-untyped]
+from thefuzz import utils
+
+_non_word = re.compile(r'\W+')
+
+# thefuzz's default processing of choices, so scores from score_matrix are identical to thefuzz's WRatio scores
+_choice_processor = partial(utils.full_process, force_ascii=True)
+
+
+def _normalize(text: str) -> str:
+    return _non_word.sub(' ', text.lower()).strip()
+
+
+class PhraseIndex:
+    """
+    Character n-gram inverted index over registered trigger phrases.
+
+    Candidate phrases are retrieved through shared n-grams, then only those candidates are scored with ``thefuzz``,
+    so lookups do not scan every registered phrase. Candidates are ranked by the fraction of n-grams they have in
+    common with the query rather than the raw number, so long phrases do not crowd out short ones, and a phrase equal
+    to the query (after normalization) is always a candidate.
+
+    The scores of candidates are exactly ``thefuzz``'s, but the best match is only the one a full
+    ``thefuzz.process.extractOne`` scan would find if that phrase is among the ``max_candidates`` retrieved. For
+    typical queries, even against large vocabularies of similar phrases, it is.
+    """
+
+    def __init__(self, ngram_size: int = 3, max_candidates: int = 32, common_gram_ratio: float = 0.1):
+        """
+
+        :param ngram_size: length of the character n-grams used for candidate retrieval
+        :param max_candidates: maximum number of candidate phrases that are fuzzy-scored per lookup
+        :param common_gram_ratio: n-grams that appear in more than this fraction of phrases are only consulted
+          when rarer n-grams produce no candidates
+        """
+        assert ngram_size >= 1
+        assert max_candidates >= 1
+        self._ngram_size = ngram_size
+        self._max_candidates = max_candidates
+        self._common_gram_ratio = common_gram_ratio
+        self._phrase_ids: dict[str, int] = {}
+        self._phrases: dict[int, str] = {}
+        self._postings: dict[str, set[int]] = {}
+        self._gram_counts: dict[int, int] = {}
+        self._normalized: dict[str, set[int]] = {}
+        self._next_id = 0
+
+    def _grams(self, text: str) -> set[str]:
+        # Grams are taken per word (padded with spaces) so word order does not matter for retrieval,
+        # in the same spirit as the token-based scorers used by WRatio
+        grams: set[str] = set()
+        n = self._ngram_size
+        for word in _normalize(text).split():
+            padded = f' {word} '
+            if len(padded) <= n:
+                grams.add(padded)
+                continue
+            for start in range(len(padded) - n + 1):
+                end = start + n
+                grams.add(padded[start:end])
+        return grams
+
+    def __len__(self) -> int:
+        return len(self._phrase_ids)
+
+    def __contains__(self, phrase: object) -> bool:
+        return phrase in self._phrase_ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._phrase_ids)
+
+    def add(self, phrase: str) -> None:
+        if phrase in self._phrase_ids:
+            raise ValueError(f'Phrase {phrase!r} already indexed')
+        phrase_id = self._next_id
+        self._next_id += 1
+        self._phrase_ids[phrase] = phrase_id
+        self._phrases[phrase_id] = phrase
+        self._normalized.setdefault(_normalize(phrase), set()).add(phrase_id)
+        grams = self._grams(phrase)
+        self._gram_counts[phrase_id] = len(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(phrase_id)
+
+    def remove(self, phrase: str) -> None:
+        phrase_id = self._phrase_ids.pop(phrase, None)
+        if phrase_id is None:
+            raise ValueError(f'Phrase {phrase!r} is not indexed')
+        del self._phrases[phrase_id]
+        del self._gram_counts[phrase_id]
+        normalized = _normalize(phrase)
+        self._normalized[normalized].discard(phrase_id)
+        if not self._normalized[normalized]:
+            del self._normalized[normalized]
+        for gram in self._grams(phrase):
+            posting = self._postings.get(gram)
+            if posting is None:
+                continue
+            posting.discard(phrase_id)
+            if not posting:
+                del self._postings[gram]
+
+    def candidates(self, query: str) -> list[str]:
+        """
+        Return the indexed phrases most similar to ``query`` by shared n-grams.
+
+        Phrases are returned in the order they were added, so scoring them breaks ties between equal scores the same
+        way as scoring all indexed phrases would.
+        """
+        query_grams = self._grams(query)
+        postings = [posting for gram in query_grams if (posting := self._postings.get(gram))]
+        selected = set(self._normalized.get(_normalize(query), ()))
+        if postings:
+            postings.sort(key=len)
+            common_limit = max(self._max_candidates, int(len(self._phrase_ids) * self._common_gram_ratio))
+            counts: Counter[int] = Counter()
+            for posting in postings:
+                if len(posting) > common_limit and counts:
+                    # Everything from here on is a very common gram; rarer grams already found candidates.
+                    break
+                counts.update(posting)
+
+            def similarity(phrase_id: int) -> tuple[float, int]:
+                # The better of the Dice coefficient (like a full comparison) and how much of the phrase occurs in
+                # the query (like a partial comparison), mirroring the two kinds of scores WRatio takes the best of.
+                # Earlier phrases win ties, as they would in a full scan.
+                shared = counts[phrase_id]
+                size = self._gram_counts[phrase_id]
+                return max(2 * shared / (len(query_grams) + size), shared / size), -phrase_id
+
+            limit = max(self._max_candidates - len(selected), 0)
+            selected.update(heapq.nlargest(limit, counts, key=similarity))
+        return [self._phrases[phrase_id] for phrase_id in sorted(selected)]
+
+    def top_matches(self, query: str, limit: int = 2) -> list[tuple[str, int]]:
+        """
+        Return up to ``limit`` best scoring indexed phrases for ``query`` along with their scores (0-100), best first.
+        """
+        candidates = self.candidates(query)
+        if not candidates:
+            return []
+        return [(item, int(score)) for item, score in process.extract(query, candidates, limit=limit)]
+
+    def score_matrix(self, queries: Sequence[str]) -> tuple[list[str], npt.NDArray[np.float64]]:
+        """
+        Score several queries (e.g., alternative transcripts of the same utterance) at once.
+
+        Candidates are retrieved for every query and the whole queries x candidates matrix is scored in one
+        vectorized pass.
+
+        :return: the candidate phrases and a matrix of scores (0-100) with one row per query and one column per
+          candidate phrase
+        """
+        candidates: dict[str, None] = {}
+        for query in queries:
+            candidates.update(dict.fromkeys(self.candidates(query)))
+        phrases = list(candidates)
+        if not phrases or not queries:
+            return phrases, np.zeros((len(queries), len(phrases)), dtype=np.float64)
+        scores = rapid_process.cdist(
+            [utils.full_process(query) for query in queries],
+            phrases,
+            scorer=fuzz.WRatio,
+            processor=_choice_processor,
+            dtype=np.float64,
+        )
+        return phrases, np.rint(scores)
+
+    def best_match(self, query: str) -> tuple[str, int] | None:
+        """
+        Return the best scoring indexed phrase for ``query`` along with its score (0-100), if any.
+        """
+        candidates = self.candidates(query)
+        if not candidates:
+            return None
+        result = process.extractOne(query, candidates)
+        if result is None:
+            return None
+        item, score = result
+        if TYPE_CHECKING:
+            assert isinstance(item, str)
+        return item, int(score)
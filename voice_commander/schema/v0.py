@@ -9,6 +9,7 @@ import pydantic
 from pydantic import BaseModel
 from pydantic import field_validator
 
+from voice_commander.action_executor import ExecutionConfigDict
 from voice_commander.actions import _action_registry
 from voice_commander.actions import ActionBase
 from voice_commander.actions import AHKMakeWindowActiveAction
@@ -123,6 +124,7 @@ class HotkeyTriggerSchema(BaseModel):
     trigger_config: HotkeyTrigger.ConfigDict
     actions: list[T_Actions]
     conditions: list[T_Conditions] = pydantic.Field(default_factory=list)
+    execution: ExecutionConfigDict = pydantic.Field(default_factory=dict)  # type: ignore[assignment]
 
     def to_trigger(self) -> HotkeyTrigger:
         return HotkeyTrigger.from_dict(self.dict())
@@ -133,6 +135,7 @@ class JoystickAxisTriggerSchema(BaseModel):
     trigger_config: JoystickAxisTrigger.ConfigDict
     actions: list[T_Actions]
     conditions: list[T_Conditions] = pydantic.Field(default_factory=list)
+    execution: ExecutionConfigDict = pydantic.Field(default_factory=dict)  # type: ignore[assignment]
 
     def to_trigger(self) -> JoystickAxisTrigger:
         return JoystickAxisTrigger.from_dict(self.dict())
@@ -143,6 +146,7 @@ class JoystickButtonTriggerSchema(BaseModel):
     trigger_config: JoystickButtonTrigger.ConfigDict
     actions: list[T_Actions]
     conditions: list[T_Conditions] = pydantic.Field(default_factory=list)
+    execution: ExecutionConfigDict = pydantic.Field(default_factory=dict)  # type: ignore[assignment]
 
     def to_trigger(self) -> JoystickButtonTrigger:
         return JoystickButtonTrigger.from_dict(self.dict())
@@ -153,6 +157,7 @@ class VoiceTriggerSchema(BaseModel):
     trigger_config: VoiceTrigger.ConfigDict
     actions: list[T_Actions]
     conditions: list[T_Conditions] = pydantic.Field(default_factory=list)
+    execution: ExecutionConfigDict = pydantic.Field(default_factory=dict)  # type: ignore[assignment]
 
     def to_trigger(self) -> VoiceTrigger:
         return VoiceTrigger.from_dict(self.dict())
@@ -163,6 +168,7 @@ class TriggerSchema(BaseModel):
     trigger_config: dict[str, Any]
     actions: list[T_Actions]
     conditions: list[T_Conditions] = pydantic.Field(default_factory=list)
+    execution: ExecutionConfigDict = pydantic.Field(default_factory=dict)  # type: ignore[assignment]
 
     @field_validator('trigger_type')
     @classmethod
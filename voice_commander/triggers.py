@@ -1,11 +1,7 @@
 from __future__ import annotations
 
 import abc
-import enum
 import logging
-import queue
-import time
-from threading import Thread
 from typing import Any
 from typing import Literal
 from typing import NotRequired
@@ -14,15 +10,29 @@ from typing import Type
 from typing import TypedDict
 from typing import TypeVar
 
+from ._utils import get_action_executor
 from ._utils import get_ahk
+from ._utils import get_axis_trigger_engine
 from ._utils import get_joy_listener
 from ._utils import get_listener
 from ._utils import get_logger
+from .action_compiler import compile_actions
+from .action_compiler import CompiledActions
+from .action_executor import ExecutionConfigDict
+from .action_executor import ExecutionPolicy
+from .action_executor import ExecutionStats
+from .action_executor import Invocation
 from .actions import ActionBase
 from .actions import restore_action
+from .axis_engine import AxisTriggerEngine
+from .axis_engine import AxisTriggerMode
+from .cancellation import CancellationToken
 from .conditions import ConditionBase
 from .conditions import restore_condition
 from .joy_listener import JoyListener
+from .match_queue import MatchQueue
+from .match_queue import MatchQueueStats
+from .match_queue import OverflowPolicy
 from .voice_listener import Listener
 
 T_Trigger = TypeVar('T_Trigger', bound='TriggerBase')
@@ -43,6 +53,41 @@ class TriggerBase:
     def __init__(self) -> None:
         self.actions: list[ActionBase] = []
         self.conditions: list[ConditionBase] = []
+        self.execution_policy: ExecutionPolicy = ExecutionPolicy.SERIAL
+        self.max_parallel: int = 1
+        self.max_queued: int | None = None
+        self.priority: int = 0
+
+    def set_execution_policy(
+        self,
+        policy: ExecutionPolicy | str,
+        max_parallel: int = 1,
+        max_queued: int | None = None,
+        priority: int = 0,
+    ) -> Self:
+        """
+        Control what happens when the trigger fires while its actions are still running from an earlier activation.
+
+        :param policy: one of :py:class:`~voice_commander.action_executor.ExecutionPolicy`
+        :param max_parallel: for the ``parallel`` policy, how many activations may run at the same time
+        :param max_queued: the maximum number of activations waiting to run; further activations are dropped
+        :param priority: when the trigger fires, running and queued activations of triggers with a lower priority are
+          cancelled. A high-priority trigger without actions can be used to stop everything.
+        """
+        assert max_parallel >= 1
+        self.execution_policy = ExecutionPolicy(policy)
+        self.max_parallel = max_parallel
+        self.max_queued = max_queued
+        self.priority = priority
+        return self
+
+    @property
+    def execution_stats(self) -> ExecutionStats:
+        """
+        Counts of queued, running, completed, failed, dropped and cancelled activations, and their queue wait and run
+        times
+        """
+        return get_action_executor().stats(self)
 
     def add_condition(self, condition: ConditionBase) -> Self:
         self.conditions.append(condition)
@@ -77,6 +122,15 @@ class TriggerBase:
             'trigger_config': self._get_config(),
             'actions': [action.to_dict() for action in self.actions],
             'conditions': [cond.to_dict() for cond in self.conditions],
+            'execution': self._get_execution_config(),
+        }
+
+    def _get_execution_config(self) -> ExecutionConfigDict:
+        return {
+            'policy': str(self.execution_policy),  # type: ignore[typeddict-item]
+            'max_parallel': self.max_parallel,
+            'max_queued': self.max_queued,
+            'priority': self.priority,
         }
 
     @abc.abstractmethod
@@ -111,16 +165,42 @@ class TriggerBase:
         for condition_data in d.get('conditions', []):
             condition = restore_condition(condition_data)
             instance.add_condition(condition)
+        instance.set_execution_policy(**d.get('execution', {}))
         return instance
 
     def check_conditions(self) -> bool:
         return all(cond.check() for cond in self.conditions)
 
     def on_trigger(self) -> None:
+        """
+        Perform the trigger's actions on the :py:class:`~voice_commander.action_executor.ActionExecutor`, according to
+        the trigger's execution policy. Returns without waiting for the actions.
+        """
+        self._submit()
+
+    def _submit(self) -> Invocation | None:
+        return get_action_executor().submit(
+            self,
+            self._perform_actions,
+            policy=self.execution_policy,
+            max_parallel=self.max_parallel,
+            max_queued=self.max_queued,
+            priority=self.priority,
+        )
+
+    def _perform_actions(self, token: CancellationToken) -> None:
         logger.debug('Checking conditions before performing actions')
         if self.check_conditions():
             logger.info('Conditions check passed. Performing actions')
-            for action in self.actions:
+            # Runs of input actions and pauses are performed in a single engine call each
+            for action in compile_actions(self.actions):
+                if token.cancelled:
+                    logger.info('Trigger activation cancelled; skipping remaining actions')
+                    return
+                if isinstance(action, CompiledActions):
+                    logger.info(f'Performing {len(action.actions)} actions in one engine call')
+                    action.perform()
+                    continue
                 logger.debug('Checking action condition')
                 if action.check_conditions():
                     logger.info('Performing action')
@@ -194,17 +274,6 @@ class JoystickButtonTrigger(HotkeyTrigger):
         return {'joystick_index': self.joystick_index, 'joystick_button': self.joystick_button}
 
 
-class AxisTriggerMode(enum.IntEnum):
-    """
-    Available trigger modes for joystick axis trigger.
-    """
-
-    VALUE_BETWEEN = 1  # Triggers when axis value is within the specified range. Resets when the value falls outside the specified range.
-    VALUE_ABOVE = 2  # Triggers when the axis value is greater than the specified value. Resets when the axis value is less than the specified value.
-    VALUE_BELOW = 3  # Triggers when the axis value is less than the specified value. Resets when the axis value is greater than the specified value.
-    VALUE_EQUALS = 4  # Triggers when the axis value is **exactly** the specified value
-
-
 class JoystickAxisTrigger(TriggerBase):
     """
     Uses AutoHotkey to monitor joystick axis values and trigger according to specified parameters
@@ -218,6 +287,7 @@ class JoystickAxisTrigger(TriggerBase):
         trigger_mode: AxisTriggerMode
         trigger_value: int | float | tuple[int | float, int | float]
         polling_frequency: NotRequired[int]
+        gesture_window: NotRequired[float]
 
     def __init__(
         self,
@@ -226,18 +296,23 @@ class JoystickAxisTrigger(TriggerBase):
         trigger_value: int | float | tuple[int | float, int | float],
         joystick_index: int,
         polling_frequency: int = 30,
+        gesture_window: float = 0.15,
     ):
         """
 
         :param axis_name: The name of the axis to monitor: X, Y, Z, R, U, V, or POV
         :param trigger_mode: one of :py:class:`~voice_commander.triggers.AxisTriggerMode` - controls the logic of trigger gates
         :param trigger_value: the axis value trigger threshold(s). When using ``VALUE_BETWEEN`` mode, use a tuple to specify the lower and upper threshold bounds.
+          When using ``RATE_ABOVE`` mode, the rate of change (axis units per second). When using ``GESTURE_FLICK`` mode, a tuple of the value the flick starts from and the value it must get past.
         :param joystick_index: the index of the joystick to monitor
-        :param polling_frequency: how frequently to check axis value (the higher this value is, the lower the delay between checks)
+        :param polling_frequency: kept for compatibility with existing configurations; axis changes are delivered at
+          the polling rate of the shared :py:class:`~voice_commander.joy_listener.JoyListener`
+        :param gesture_window: for ``RATE_ABOVE`` and ``GESTURE_FLICK`` modes, the time span (in seconds) in which the
+          movement must happen
         """
         super().__init__()
         assert axis_name in ['X', 'Y', 'Z', 'V', 'U', 'R']
-        assert int(trigger_mode) in (1, 2, 3, 4)
+        assert int(trigger_mode) in (1, 2, 3, 4, 5, 6)
         if trigger_mode == 1:
             trigger_mode = AxisTriggerMode.VALUE_BETWEEN
         elif trigger_mode == 2:
@@ -246,6 +321,10 @@ class JoystickAxisTrigger(TriggerBase):
             trigger_mode = AxisTriggerMode.VALUE_BELOW
         elif trigger_mode == 4:
             trigger_mode = AxisTriggerMode.VALUE_EQUALS
+        elif trigger_mode == 5:
+            trigger_mode = AxisTriggerMode.RATE_ABOVE
+        elif trigger_mode == 6:
+            trigger_mode = AxisTriggerMode.GESTURE_FLICK
         else:
             raise ValueError(f"Invalid trigger mode: {trigger_mode!r}")
         self.joystick_index = joystick_index
@@ -253,76 +332,10 @@ class JoystickAxisTrigger(TriggerBase):
         self.trigger_mode: AxisTriggerMode = trigger_mode
         self.trigger_value = trigger_value
         self.polling_frequency = polling_frequency
+        self.gesture_window = gesture_window
         self._joy_listener: JoyListener = get_joy_listener()
-        self._listener_thread: Thread | None = None
-        self._running: bool = False
-        self._awaiting_reset: bool = True
-
-    def _evaluate_trigger(self, current_value: int | float, last_value: int | float) -> None:
-        if self.trigger_mode == AxisTriggerMode.VALUE_BELOW:
-            assert isinstance(self.trigger_value, (int, float))
-            if current_value > self.trigger_value:
-                if self._awaiting_reset:
-                    self._awaiting_reset = False
-            elif current_value < self.trigger_value:
-                if not self._awaiting_reset:
-                    self._awaiting_reset = True
-                    self.on_trigger()
-
-        elif self.trigger_mode == AxisTriggerMode.VALUE_ABOVE:
-            assert isinstance(self.trigger_value, (int, float))
-
-            if current_value < self.trigger_value:
-                if self._awaiting_reset:
-                    self._awaiting_reset = False
-            elif current_value > self.trigger_value:
-                if not self._awaiting_reset:
-                    self._awaiting_reset = True
-                    self.on_trigger()
-        elif self.trigger_mode == AxisTriggerMode.VALUE_BETWEEN:
-            assert isinstance(self.trigger_value, tuple)
-            lower_bound, upper_bound = self.trigger_value
-            if lower_bound < current_value < upper_bound:
-                if not self._awaiting_reset:
-                    self._awaiting_reset = True
-                    self.on_trigger()
-            else:
-                if self._awaiting_reset:
-                    self._awaiting_reset = False
-
-        elif self.trigger_mode == AxisTriggerMode.VALUE_EQUALS:
-            assert isinstance(self.trigger_value, (int, float))
-            if current_value == self.trigger_value:
-                if not self._awaiting_reset:
-                    self._awaiting_reset = True
-                    self.on_trigger()
-            else:
-                if self._awaiting_reset:
-                    self._awaiting_reset = False
-
-    def _listen_joystick(self) -> None:
-        last_value = None
-        start_attempts = 0
-        while True:
-            try:
-                self._joy_listener.get_joystick_axis_value(axis=self.axis_name, joystick_index=self.joystick_index)
-                break
-            except Exception:
-                if start_attempts >= 5:
-                    raise
-                start_attempts += 1
-                time.sleep(0.2)
-
-        while True:
-            if not self._running:
-                break
-            time.sleep(1 / self.polling_frequency)
-            current_value = self._joy_listener.get_joystick_axis_value(
-                axis=self.axis_name, joystick_index=self.joystick_index
-            )
-            if last_value is None:
-                last_value = current_value
-            self._evaluate_trigger(current_value, last_value)
+        self._engine: AxisTriggerEngine = get_axis_trigger_engine()
+        self._engine_handle: int | None = None
 
     def _get_config(self) -> ConfigDict:
         return {
@@ -331,6 +344,7 @@ class JoystickAxisTrigger(TriggerBase):
             'trigger_mode': int(self.trigger_mode),  # type: ignore[typeddict-item]
             'trigger_value': self.trigger_value,
             'polling_frequency': self.polling_frequency,
+            'gesture_window': self.gesture_window,
         }
 
     @classmethod
@@ -341,7 +355,7 @@ class JoystickAxisTrigger(TriggerBase):
         trigger_mode_int = kwargs.pop('trigger_mode', None)
         match trigger_mode_int:
             case AxisTriggerMode():
-                kwargs['trigger_value'] = trigger_mode_int
+                kwargs['trigger_mode'] = trigger_mode_int
             case 1:
                 kwargs['trigger_mode'] = AxisTriggerMode.VALUE_BETWEEN
             case 2:
@@ -350,29 +364,37 @@ class JoystickAxisTrigger(TriggerBase):
                 kwargs['trigger_mode'] = AxisTriggerMode.VALUE_BELOW
             case 4:
                 kwargs['trigger_mode'] = AxisTriggerMode.VALUE_EQUALS
+            case 5:
+                kwargs['trigger_mode'] = AxisTriggerMode.RATE_ABOVE
+            case 6:
+                kwargs['trigger_mode'] = AxisTriggerMode.GESTURE_FLICK
             case _:
                 raise ValueError(f'invalid trigger mode: {trigger_mode_int!r}')
         instance = cls(**kwargs)
         for action_data in d.get('actions', []):
             action = ActionBase.from_dict(action_data)
             instance.add_action(action)
+        instance.set_execution_policy(**d.get('execution', {}))
         return instance
 
     def install_hook(self) -> None:
-        assert self._listener_thread is None
-        assert self._running is False
-        self._running = True
+        assert self._engine_handle is None
+        self._engine_handle = self._engine.add(
+            self.joystick_index,
+            self.axis_name,
+            self.trigger_mode,
+            self.trigger_value,
+            self.on_trigger,
+            gesture_window=self.gesture_window,
+        )
         self._joy_listener.start()
-        self._listener_thread = Thread(target=self._listen_joystick)
-        self._listener_thread.start()
 
     def uninstall_hook(self) -> None:
-        assert self._running is True
-        assert self._listener_thread is not None
-        self._running = False
-        self._listener_thread.join()
-        self._listener_thread = None
-        self._joy_listener.stop()  # XXX: hmm...
+        assert self._engine_handle is not None
+        self._engine.remove(self._engine_handle)
+        self._engine_handle = None
+        if not self._joy_listener.has_subscribers:
+            self._joy_listener.stop()
 
 
 class VoiceTrigger(TriggerBase):
@@ -380,38 +402,113 @@ class VoiceTrigger(TriggerBase):
     Trigger on spoken voice commands. You can add multiple trigger phrases at once.
     """
 
-    ConfigDict = TypedDict('ConfigDict', {'*trigger_phrases': list[str]})
+    ConfigDict = TypedDict(
+        'ConfigDict',
+        {
+            '*trigger_phrases': list[str],
+            'max_pending': NotRequired[int],
+            'overflow_policy': NotRequired[OverflowPolicy],
+            'coalesce_window': NotRequired[float],
+        },
+    )
 
-    def __init__(self, *trigger_phrases: str):
+    def __init__(
+        self,
+        *trigger_phrases: str,
+        max_pending: int = 3,
+        overflow_policy: OverflowPolicy | str = OverflowPolicy.DROP_NEWEST,
+        coalesce_window: float = 0.5,
+    ):
+        """
+
+        :param trigger_phrases: the phrases which activate this trigger
+        :param max_pending: the maximum number of matches waiting to be performed while the trigger's actions are
+          still running (or, for the ``parallel`` execution policy, while ``max_parallel`` activations are running)
+        :param overflow_policy: one of :py:class:`~voice_commander.match_queue.OverflowPolicy` - what to do with
+          matches that arrive while ``max_pending`` matches are already waiting
+        :param coalesce_window: for the ``coalesce`` policy, repeated matches within this many seconds are discarded
+        """
         super().__init__()
         self.trigger_phrases: list[str] = [phrase.lower() for phrase in trigger_phrases]
+        self.max_pending = max_pending
+        self.overflow_policy = OverflowPolicy(overflow_policy)
+        self.coalesce_window = coalesce_window
         self._listener: Listener = get_listener()
-        self._match_queue: queue.Queue[str] = self._listener.add_trigger_phrases(self.trigger_phrases)
-        self._thread: Thread | None = None
-
-    def _wait_for_trigger(self) -> None:
-        while True:
-            msg = self._match_queue.get()
-            if msg == 'STOP':
-                self._match_queue.task_done()
-                break
-            logging.info(f'received voice trigger for msg: {msg}')
-            self.on_trigger()
-            self._match_queue.task_done()
+        self._match_queue = MatchQueue(
+            maxsize=max_pending,
+            policy=overflow_policy,
+            coalesce_window=coalesce_window,
+            max_in_flight=self._max_in_flight(),
+        )
+        self._installed: bool = False
+
+    def _max_in_flight(self) -> int | None:
+        # Matches are held back in the match queue (where max_pending and the overflow policy apply) instead of
+        # piling up in the executor while as many activations are in flight as the execution policy runs at once.
+        # Restarting and dropping policies decide for themselves what to do with a new activation, so they get every
+        # match right away.
+        if self.execution_policy is ExecutionPolicy.SERIAL:
+            return 1
+        if self.execution_policy is ExecutionPolicy.PARALLEL:
+            return self.max_parallel
         return None
 
+    def set_execution_policy(
+        self,
+        policy: ExecutionPolicy | str,
+        max_parallel: int = 1,
+        max_queued: int | None = None,
+        priority: int = 0,
+    ) -> Self:
+        super().set_execution_policy(policy, max_parallel=max_parallel, max_queued=max_queued, priority=priority)
+        self._match_queue.max_in_flight = self._max_in_flight()
+        return self
+
+    @property
+    def match_queue_stats(self) -> MatchQueueStats:
+        """
+        Current depth of the pending match queue and the number of accepted and dropped matches
+        """
+        return self._match_queue.stats()
+
+    def _on_match(self, msg: str) -> None:
+        logging.info(f'received voice trigger for msg: {msg}')
+        try:
+            invocation = self._submit()
+        except BaseException:
+            self._match_queue.task_done()
+            raise
+        if invocation is None:
+            self._match_queue.task_done()
+        else:
+            # Also called for activations that are cancelled before they run
+            invocation.future.add_done_callback(lambda _: self._on_invocation_done(invocation))
+
+    def _on_invocation_done(self, invocation: Invocation) -> None:
+        if invocation.preempted:
+            # A higher-priority command (e.g. "stop all") also stops the matches held back behind this activation
+            self._match_queue.clear()
+        self._match_queue.task_done()
+
     def _get_config(self) -> dict[str, Any]:
-        return {'*trigger_phrases': self.trigger_phrases}
+        return {
+            '*trigger_phrases': self.trigger_phrases,
+            'max_pending': self.max_pending,
+            'overflow_policy': str(self.overflow_policy),
+            'coalesce_window': self.coalesce_window,
+        }
 
     def install_hook(self) -> None:
-        assert self._thread is None
-        self._thread = Thread(target=self._wait_for_trigger)
-        self._thread.start()
+        assert self._installed is False
+        self._listener.add_trigger_phrases(self.trigger_phrases, callback=self._on_match, match_queue=self._match_queue)
+        self._installed = True
         self._listener.start()
 
     def uninstall_hook(self) -> None:
-        assert self._thread is not None
-        self._match_queue.put_nowait('STOP')
-        self._thread.join()
-        self._thread = None
-        self._listener.stop()
+        assert self._installed is True
+        for phrase in self.trigger_phrases:
+            self._listener.remove_trigger_phrase(phrase)
+        self._installed = False
+        self._match_queue.clear()
+        if not self._listener.trigger_phrases:
+            self._listener.stop()
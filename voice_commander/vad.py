@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import enum
+from typing import NamedTuple
+from typing import NotRequired
+from typing import TypedDict
+from typing import Unpack
+
+import numpy as np
+import numpy.typing as npt
+
+_sample_dtypes: dict[int, str] = {2: '<i2', 4: '<i4'}
+
+
+class VADEventKind(enum.Enum):
+    START = 'start'  # speech onset detected
+    AUDIO = 'audio'  # audio belonging to the current utterance
+    END = 'end'  # utterance closed; carries the complete (trimmed) utterance audio
+
+
+class VADEvent(NamedTuple):
+    kind: VADEventKind
+    audio: bytes
+
+
+class VoiceActivityDetector:
+    """
+    Splits a raw PCM stream into utterances based on frame energy.
+
+    Audio is processed in fixed-size frames. The RMS energy of every frame in a chunk is computed in a single NumPy
+    pass and compared against an adaptive estimate of the background noise floor. A ring buffer of recent frames
+    (the pre-roll) is prepended to each utterance so word onsets are not clipped, and an utterance is closed once
+    speech has been absent for the configured hangover.
+    """
+
+    class ConfigDict(TypedDict):
+        frame_duration: NotRequired[float]
+        pre_roll: NotRequired[float]
+        hangover: NotRequired[float]
+        min_speech: NotRequired[float]
+        max_utterance: NotRequired[float]
+        calibration: NotRequired[float]
+        threshold_ratio: NotRequired[float]
+        min_energy: NotRequired[float]
+        noise_adaptation: NotRequired[float]
+
+    def __init__(self, sample_rate: int, sample_width: int, **config: Unpack[ConfigDict]):
+        """
+
+        :param sample_rate: sample rate of the incoming audio, in Hz
+        :param sample_width: width of each (mono) sample, in bytes. 2 and 4 are supported.
+        :param config: optional tuning parameters. Durations are in seconds.
+          ``frame_duration`` (0.02) is the analysis frame length;
+          ``pre_roll`` (0.3) is how much audio before speech onset is kept;
+          ``hangover`` (0.3) is how long speech must be absent before an utterance is closed;
+          ``min_speech`` (0.06) is how long energy must stay above the threshold to count as speech;
+          ``max_utterance`` (15.0) forcibly closes overly long utterances;
+          ``calibration`` (0.5) is how much audio is used for the initial noise floor estimate;
+          ``threshold_ratio`` (3.0) is how far above the noise floor a frame must be to count as speech;
+          ``min_energy`` (100.0) is a lower bound on the speech threshold, in raw sample units;
+          ``noise_adaptation`` (0.05) is the rate at which the noise floor follows non-speech frames.
+        """
+        if sample_width not in _sample_dtypes:
+            raise ValueError(f'Unsupported sample width: {sample_width!r}')
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self._dtype = np.dtype(_sample_dtypes[sample_width])
+        frame_duration = config.get('frame_duration', 0.02)
+        self._frame_samples = max(1, int(sample_rate * frame_duration))
+        self._frame_bytes = self._frame_samples * sample_width
+
+        def frames_for(seconds: float) -> int:
+            return max(1, round(seconds / frame_duration))
+
+        self._pre_roll_frames = frames_for(config.get('pre_roll', 0.3))
+        self._hangover_frames = frames_for(config.get('hangover', 0.3))
+        self._min_speech_frames = frames_for(config.get('min_speech', 0.06))
+        self._max_utterance_frames = frames_for(config.get('max_utterance', 15.0))
+        self._calibration_frames = frames_for(config.get('calibration', 0.5))
+        self._threshold_ratio = config.get('threshold_ratio', 3.0)
+        self._min_energy = config.get('min_energy', 100.0)
+        self._noise_adaptation = config.get('noise_adaptation', 0.05)
+
+        self._pre_roll: npt.NDArray[np.generic] = np.zeros(
+            (self._pre_roll_frames, self._frame_samples), dtype=self._dtype
+        )
+        self._pending = bytearray()
+        self._utterance: list[npt.NDArray[np.generic]] = []
+        self._noise_floor = 0.0
+        self._calibrated = 0
+        self.reset()
+
+    @property
+    def noise_floor(self) -> float | None:
+        """
+        The current estimate of the background noise energy, or ``None`` while still calibrating.
+        """
+        if self._calibrated < self._calibration_frames:
+            return None
+        return self._noise_floor
+
+    @property
+    def threshold(self) -> float:
+        return max(self._noise_floor * self._threshold_ratio, self._min_energy)
+
+    def reset(self, recalibrate: bool = False) -> None:
+        """
+        Discard any buffered audio and partially captured utterance.
+
+        :param recalibrate: also discard the noise floor estimate and calibrate again from upcoming audio
+        """
+        self._pending.clear()
+        self._pre_roll_pos = 0
+        self._pre_roll_count = 0
+        self._speech_run = 0
+        self._silence_run = 0
+        self._utterance = []
+        if recalibrate:
+            self._noise_floor = 0.0
+            self._calibrated = 0
+
+    def _frame_energies(self, frames: npt.NDArray[np.generic]) -> npt.NDArray[np.float64]:
+        samples = frames.astype(np.float64)
+        return np.sqrt(np.mean(samples * samples, axis=1))
+
+    def _push_pre_roll(self, frame: npt.NDArray[np.generic]) -> None:
+        self._pre_roll[self._pre_roll_pos] = frame
+        self._pre_roll_pos = (self._pre_roll_pos + 1) % self._pre_roll_frames
+        self._pre_roll_count = min(self._pre_roll_count + 1, self._pre_roll_frames)
+
+    def _drain_pre_roll(self) -> list[npt.NDArray[np.generic]]:
+        start = (self._pre_roll_pos - self._pre_roll_count) % self._pre_roll_frames
+        indices = (start + np.arange(self._pre_roll_count)) % self._pre_roll_frames
+        self._pre_roll_count = 0
+        return list(self._pre_roll[indices])
+
+    def _update_noise_floor(self, energy: float) -> None:
+        if self._calibrated < self._calibration_frames:
+            self._calibrated += 1
+            self._noise_floor += (energy - self._noise_floor) / self._calibrated
+        elif energy < self._noise_floor:
+            # Follow drops in background noise immediately, rises only gradually
+            self._noise_floor = energy
+        else:
+            self._noise_floor += self._noise_adaptation * (energy - self._noise_floor)
+
+    def _finish_utterance(self) -> bytes:
+        # Trim trailing silence down to the same padding the pre-roll adds in front
+        excess_silence = max(0, self._silence_run - self._pre_roll_frames)
+        frames = self._utterance[: len(self._utterance) - excess_silence]
+        self._utterance = []
+        self._silence_run = 0
+        self._speech_run = 0
+        return np.concatenate(frames).tobytes()
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """
+        Process a chunk of raw audio.
+
+        :param data: raw PCM audio, of any length
+        :return: the raw audio of every utterance completed within this chunk (possibly none)
+        """
+        return [event.audio for event in self.process(data) if event.kind is VADEventKind.END]
+
+    def process(self, data: bytes) -> list[VADEvent]:
+        """
+        Process a chunk of raw audio, reporting utterance boundaries and audio as it is captured.
+
+        Useful for streaming recognition: a ``START`` event is followed by ``AUDIO`` events carrying the utterance
+        audio (beginning with the pre-roll) as it arrives, then an ``END`` event carrying the complete utterance.
+
+        :param data: raw PCM audio, of any length
+        """
+        self._pending.extend(data)
+        n_frames = len(self._pending) // self._frame_bytes
+        if n_frames == 0:
+            return []
+        usable = n_frames * self._frame_bytes
+        frames = np.frombuffer(bytes(self._pending[:usable]), dtype=self._dtype).reshape(n_frames, self._frame_samples)
+        del self._pending[:usable]
+        energies = self._frame_energies(frames)
+
+        events: list[VADEvent] = []
+        # frames of the current utterance which have already been reported in AUDIO events
+        streamed = len(self._utterance)
+
+        def flush_audio() -> None:
+            if len(self._utterance) > streamed:
+                events.append(VADEvent(VADEventKind.AUDIO, np.concatenate(self._utterance[streamed:]).tobytes()))
+
+        for frame, energy in zip(frames, energies.tolist()):
+            if self._calibrated < self._calibration_frames:
+                self._update_noise_floor(energy)
+                self._push_pre_roll(frame)
+                continue
+            is_speech = energy > self.threshold
+            if not self._utterance:
+                self._push_pre_roll(frame)
+                if not is_speech:
+                    self._speech_run = 0
+                    self._update_noise_floor(energy)
+                    continue
+                self._speech_run += 1
+                if self._speech_run >= self._min_speech_frames:
+                    self._utterance = self._drain_pre_roll()
+                    self._silence_run = 0
+                    streamed = 0
+                    events.append(VADEvent(VADEventKind.START, b''))
+                continue
+            self._utterance.append(frame)
+            if is_speech:
+                self._silence_run = 0
+            else:
+                self._silence_run += 1
+            if self._silence_run >= self._hangover_frames or len(self._utterance) >= self._max_utterance_frames:
+                flush_audio()
+                events.append(VADEvent(VADEventKind.END, self._finish_utterance()))
+                streamed = 0
+        flush_audio()
+        return events
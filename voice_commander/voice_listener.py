@@ -3,135 +3,378 @@ from __future__ import annotations
 import logging
 import queue
 import time
-import warnings
+from collections.abc import Callable
 from collections.abc import Sequence
+from functools import partial
 from threading import Lock
 from threading import Thread
-from typing import TYPE_CHECKING
 
+import numpy as np
 import speech_recognition as sr  # type: ignore[import-untyped]
 from speech_recognition import AudioData
-from thefuzz import process  # type: ignore[import-untyped]
 
 from voice_commander._utils import get_logger
+from voice_commander.match_queue import MatchQueue
+from voice_commander.phrase_index import PhraseIndex
+from voice_commander.recognizers import Alternative
+from voice_commander.recognizers import RecognitionStream
+from voice_commander.recognizers import RecognizerBackend
+from voice_commander.recognizers import SpeechRecognitionBackend
+from voice_commander.vad import VADEventKind
+from voice_commander.vad import VoiceActivityDetector
 
 logger = get_logger()
 
 
+class _StreamedUtterance:
+    """
+    An utterance handed to a recognition worker while it is still being captured.
+    Audio chunks arrive on ``chunks``; ``None`` marks the end of the utterance.
+    """
+
+    def __init__(self, sample_rate: int, sample_width: int):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.chunks: queue.SimpleQueue[bytes | None] = queue.SimpleQueue()
+
+    def read_all(self) -> AudioData:
+        return AudioData(b''.join(iter(self.chunks.get, None)), self.sample_rate, self.sample_width)
+
+
 class Listener:
-    def __init__(self) -> None:
-        self._listen_threads: int = 3
-        self._listen_timeout: int = 5
+    """
+    Captures audio from the microphone and reports recognized phrases to the callbacks of registered triggers.
+
+    A single capture thread keeps the microphone stream open and splits it into utterances using a
+    :py:class:`~voice_commander.vad.VoiceActivityDetector`. Utterances are handed to a pool of recognition workers
+    through a bounded queue. When the queue is full, the oldest pending utterance is dropped so capture never stalls
+    on recognition.
+
+    When the recognizer backend supports streaming, utterances are recognized while they are still being spoken and a
+    trigger phrase fires as soon as a partial hypothesis matches it unambiguously. The final result of that utterance
+    will not fire the same phrase again.
+
+    Trigger callbacks are all invoked from a single dispatcher thread, regardless of how many triggers are registered.
+    Matches waiting to be dispatched are held in a bounded :py:class:`~voice_commander.match_queue.MatchQueue` per
+    trigger.
+    """
+
+    def __init__(
+        self,
+        recognition_workers: int = 3,
+        utterance_queue_size: int = 8,
+        vad_config: VoiceActivityDetector.ConfigDict | None = None,
+        recognizer: RecognizerBackend | None = None,
+        streaming: bool = True,
+        early_match_threshold: int = 90,
+        early_match_margin: int = 15,
+    ) -> None:
+        """
+
+        :param recognition_workers: the number of threads performing speech recognition on captured utterances
+        :param utterance_queue_size: the maximum number of captured utterances waiting for recognition
+        :param vad_config: tuning parameters for voice activity detection (e.g., ``hangover``).
+          See :py:class:`~voice_commander.vad.VoiceActivityDetector`
+        :param recognizer: the speech recognition backend. Defaults to Google's web API via
+          :py:class:`~voice_commander.recognizers.SpeechRecognitionBackend`
+        :param streaming: use streaming recognition with early triggering, when the recognizer backend supports it
+        :param early_match_threshold: the minimum match score (0-100) a partial hypothesis needs to fire a trigger early
+        :param early_match_margin: how much better (in match score) than the runner-up phrase a partial hypothesis
+          must match its best phrase to fire a trigger early
+        """
+        assert recognition_workers >= 1
+        assert utterance_queue_size >= 1
+        self._recognition_workers: int = recognition_workers
+        self._vad_config: VoiceActivityDetector.ConfigDict = vad_config or {}
         self._listening: bool = False
         self._running: bool = False
-        self._mic_lock = Lock()
         self._reporting_lock = Lock()
-        self._recognizer_name = 'google'
-        self._recognizer = sr.Recognizer()
-        self._listener_threads: list[Thread] = []
-        self._reporting_queues: dict[str, queue.Queue[str]] = {}
+        self._recognizer: RecognizerBackend = recognizer or SpeechRecognitionBackend('google')
+        self._capture_thread: Thread | None = None
+        self._worker_threads: list[Thread] = []
+        self._utterances: queue.Queue[AudioData | _StreamedUtterance | None] = queue.Queue(maxsize=utterance_queue_size)
+        self._reporting_callbacks: dict[str, tuple[Callable[[str], None], MatchQueue]] = {}
+        self._dispatch_queue: queue.Queue[tuple[Callable[[str], None], MatchQueue] | None] = queue.Queue()
+        self._dispatcher_thread: Thread | None = None
+        self._phrase_index = PhraseIndex()
         self._match_threshold: int = 50
+        # Weight of each successive alternative transcript, relative to the one before it, when the recognizer does
+        # not report a confidence for it
+        self._alternative_decay: float = 0.9
+        self._streaming: bool = streaming
+        self._early_match_threshold: int = early_match_threshold
+        self._early_match_margin: int = early_match_margin
+
+    def add_trigger_phrases(
+        self, phrases: Sequence[str], callback: Callable[[str], None], match_queue: MatchQueue | None = None
+    ) -> MatchQueue:
+        """
+        Register phrases which, when recognized, call ``callback`` with the recognized text (on the dispatcher thread)
+
+        Raises ``ValueError`` (and registers none of the phrases) if any phrase is already registered.
 
-    def add_trigger_phrases(self, phrases: Sequence[str]) -> queue.Queue[str]:
-        q: queue.Queue[str] = queue.Queue()
-        for phrase in phrases:
-            phrase = phrase.lower()
-            if phrase in self._reporting_queues:
-                raise ValueError(f'Phrase {phrase!r} already registered')
-            with self._reporting_lock:
-                self._reporting_queues[phrase] = q
-        return q
+        :param match_queue: holds matches of these phrases until they are dispatched. A default
+          :py:class:`~voice_commander.match_queue.MatchQueue` is created if not provided. If it limits the matches in
+          flight, matches held back are dispatched when the callback's owner calls its ``task_done``.
+        :return: the match queue for these phrases
+        """
+        if match_queue is None:
+            match_queue = MatchQueue()
+        phrases = [phrase.lower() for phrase in phrases]
+        with self._reporting_lock:
+            for phrase in phrases:
+                if phrase in self._reporting_callbacks:
+                    raise ValueError(f'Phrase {phrase!r} already registered')
+            for phrase in phrases:
+                self._reporting_callbacks[phrase] = (callback, match_queue)
+                self._phrase_index.add(phrase)
+            match_queue.on_ready = partial(self._dispatch_queue.put, (callback, match_queue))
+            self._recognizer.set_phrases(self._reporting_callbacks.keys())
+        return match_queue
 
     def remove_trigger_phrase(self, phrase: str) -> None:
-        if phrase not in self._reporting_queues:
-            raise ValueError('Phrase not registered')
-        self._reporting_queues.pop(phrase)
+        phrase = phrase.lower()
+        with self._reporting_lock:
+            if phrase not in self._reporting_callbacks:
+                raise ValueError('Phrase not registered')
+            self._reporting_callbacks.pop(phrase)
+            self._phrase_index.remove(phrase)
+            self._recognizer.set_phrases(self._reporting_callbacks.keys())
         return None
 
-    def _match_command(self, value: str) -> str | None:
-        item, ratio = process.extractOne(value, self._reporting_queues.keys())
-        if ratio >= self._match_threshold:
-            if TYPE_CHECKING:
-                assert isinstance(item, str)
-            return item
-        else:
+    @property
+    def trigger_phrases(self) -> list[str]:
+        with self._reporting_lock:
+            return list(self._reporting_callbacks)
+
+    def _match_alternatives(self, alternatives: list[Alternative]) -> tuple[str, str] | None:
+        """
+        Score every alternative transcript against the registered phrases at once and pick the best pair,
+        weighting scores by recognizer confidence.
+
+        :return: the matching phrase and the transcript which matched it, if the match is above the threshold
+        """
+        transcripts = [transcript for transcript, _ in alternatives]
+        with self._reporting_lock:
+            phrases, scores = self._phrase_index.score_matrix(transcripts)
+        if not phrases:
+            return None
+        top_weight = alternatives[0][1] if alternatives[0][1] is not None else 1.0
+        weights = np.array(
+            [
+                confidence if confidence is not None else top_weight * self._alternative_decay**rank
+                for rank, (_, confidence) in enumerate(alternatives)
+            ]
+        )
+        row, column = np.unravel_index(np.argmax(scores * weights[:, np.newaxis]), scores.shape)
+        # The threshold applies to the unweighted score, so it means the same as for a single transcript
+        if scores[row, column] >= self._match_threshold:
+            return phrases[column], transcripts[row]
+        return None
+
+    def _match_early(self, value: str) -> str | None:
+        with self._reporting_lock:
+            matches = self._phrase_index.top_matches(value, limit=2)
+        if not matches:
+            return None
+        item, ratio = matches[0]
+        if ratio < max(self._match_threshold, self._early_match_threshold):
+            return None
+        if len(matches) > 1 and ratio - matches[1][1] < self._early_match_margin:
             return None
+        return item
 
     def start(self) -> None:
         if self._running:
             return
+        # An unusable audio format (or VAD configuration) fails here, rather than in the capture thread, which would
+        # keep reopening the microphone and failing again
+        microphone = sr.Microphone()
+        vad = VoiceActivityDetector(microphone.SAMPLE_RATE, microphone.SAMPLE_WIDTH, **self._vad_config)
         self._running = True
         self._listening = True
-        for _ in range(self._listen_threads):
-            t = Thread(target=self._listen)
+        self._dispatcher_thread = Thread(target=self._dispatch, name='voice-dispatcher')
+        self._dispatcher_thread.start()
+        for i in range(self._recognition_workers):
+            t = Thread(target=self._recognize, name=f'voice-recognizer-{i}')
             t.start()
-            self._listener_threads.append(t)
+            self._worker_threads.append(t)
+        self._capture_thread = Thread(target=self._capture, args=(microphone, vad), name='voice-capture')
+        self._capture_thread.start()
 
     def stop(self) -> None:
         if self._running or self._listening:
             logger.info('Stopping voice listener (this may take a few seconds)...')
             self._running = False
             self._listening = False
-            while self._listener_threads:
-                t = self._listener_threads.pop()
+            if self._capture_thread is not None:
+                self._capture_thread.join()
+                self._capture_thread = None
+            for _ in self._worker_threads:
+                self._utterances.put(None)
+            while self._worker_threads:
+                t = self._worker_threads.pop()
                 t.join()
+            if self._dispatcher_thread is not None:
+                self._dispatch_queue.put(None)
+                self._dispatcher_thread.join()
+                self._dispatcher_thread = None
             logger.info('Voice listener stopped')
         else:
             logger.debug('Stop called on already-stopped listener')
 
+    def set_recognizer(self, recognizer: RecognizerBackend) -> None:
+        """
+        Replace the speech recognition backend. Takes effect for the next recognized utterance.
+        """
+        with self._reporting_lock:
+            recognizer.set_phrases(self._reporting_callbacks.keys())
+            self._recognizer = recognizer
+
     def start_listening(self) -> None:
         self._listening = True
 
     def stop_listening(self) -> None:
         self._listening = False
 
-    def _analyze(self, audio: AudioData) -> str | None:
-        recognizer_func = getattr(self._recognizer, f'recognize_{self._recognizer_name}', None)
-        if recognizer_func is None:
-            warnings.warn(f'Unknown recognizer name {self._recognizer_name!r}. Falling back to google recognizer')
-            recognizer_func = self._recognizer.recognize_google
+    def _analyze(self, audio: AudioData | RecognitionStream) -> list[Alternative]:
         try:
-            value = recognizer_func(audio)
-            if TYPE_CHECKING:
-                assert isinstance(value, str)
-            logging.info('Recognized text: "{}"'.format(value))
-            return value
+            if isinstance(audio, RecognitionStream):
+                alternatives = audio.finish_alternatives()
+            else:
+                alternatives = self._recognizer.recognize_alternatives(audio)
+            logging.info('Recognized text: "{}"'.format(alternatives[0][0]))
+            if len(alternatives) > 1:
+                logging.debug('Alternative transcripts: {!r}'.format(alternatives[1:]))
+            return alternatives
         except sr.UnknownValueError as e:
             logging.debug('Issue recognizing audio; {}'.format(e))
         except sr.RequestError as e:
-            msg = "Couldn't request results from Google Speech Recognition service; {0}".format(e)
+            msg = "Couldn't request results from {0} speech recognition backend; {1}".format(self._recognizer.name, e)
             logging.warning(msg)
-        return None
+        return []
 
-    def _listen(self) -> None:
-        logging.debug('LISTENER STARTED')
+    def _deliver(self, phrase: str, value: str) -> None:
+        with self._reporting_lock:
+            registration = self._reporting_callbacks.get(phrase)
+        if registration is None:
+            return
+        callback, match_queue = registration
+        if match_queue.put(value):
+            self._dispatch_queue.put((callback, match_queue))
+
+    def _report(self, alternatives: list[Alternative], already_reported: str | None = None) -> None:
+        if not alternatives:
+            return
+        logger.debug('Attempting to match audio to known phrase')
+        match = self._match_alternatives(alternatives)
+        if match is None:
+            return
+        matching_phrase, value = match
+        if matching_phrase != already_reported:
+            self._deliver(matching_phrase, value)
+
+    def _enqueue_utterance(self, audio: AudioData | _StreamedUtterance) -> None:
         while True:
-            if not self._listening:
-                logging.debug('Listening is currently disabled. Waiting one second.')
+            try:
+                self._utterances.put_nowait(audio)
+                return
+            except queue.Full:
+                try:
+                    self._utterances.get_nowait()
+                    logger.warning('Recognition is falling behind; dropping oldest captured utterance')
+                except queue.Empty:
+                    pass
+
+    def _capture(self, microphone: sr.Microphone, vad: VoiceActivityDetector) -> None:
+        logger.debug('CAPTURE STARTED')
+        streamed: _StreamedUtterance | None = None
+        while self._running:
+            try:
+                # The device stream stays open for as long as the listener runs;
+                # it is only reopened if reading from it fails.
+                with microphone as source:
+                    vad.reset()
+                    while self._running:
+                        if not self._listening:
+                            if streamed is not None:
+                                streamed.chunks.put(None)
+                                streamed = None
+                            vad.reset()
+                            time.sleep(0.1)
+                            continue
+                        chunk = source.stream.read(source.CHUNK)
+                        for event in vad.process(chunk):
+                            if event.kind is VADEventKind.START:
+                                if self._streaming and self._recognizer.supports_streaming:
+                                    streamed = _StreamedUtterance(source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+                                    self._enqueue_utterance(streamed)
+                            elif event.kind is VADEventKind.AUDIO:
+                                if streamed is not None:
+                                    streamed.chunks.put(event.audio)
+                            elif streamed is not None:
+                                streamed.chunks.put(None)
+                                streamed = None
+                            else:
+                                audio = AudioData(event.audio, source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+                                self._enqueue_utterance(audio)
+            except Exception as e:
+                logger.error(e, exc_info=True)
                 time.sleep(1)
+            finally:
+                if streamed is not None:
+                    streamed.chunks.put(None)
+                    streamed = None
+        logger.debug('CAPTURE STOPPED')
+
+    def _recognize_streamed(self, utterance: _StreamedUtterance) -> None:
+        stream = self._recognizer.start_stream(utterance.sample_rate, utterance.sample_width)
+        if stream is None:
+            self._report(self._analyze(utterance.read_all()))
+            return
+        early_phrase: str | None = None
+        last_partial: str | None = None
+        while (data := utterance.chunks.get()) is not None:
+            partial = stream.feed(data)
+            if early_phrase is not None or partial is None or partial == last_partial:
                 continue
-            if not self._running:
+            last_partial = partial
+            early_phrase = self._match_early(partial)
+            if early_phrase is not None:
+                logger.info(f'Triggering early on partial hypothesis "{partial}"')
+                self._deliver(early_phrase, partial)
+        self._report(self._analyze(stream), already_reported=early_phrase)
+
+    def _dispatch(self) -> None:
+        logger.debug('DISPATCHER STARTED')
+        while True:
+            item = self._dispatch_queue.get()
+            if item is None:
                 break
+            callback, match_queue = item
+            value = match_queue.get_nowait()
+            if value is None:
+                # the match was displaced by a newer one according to the queue's overflow policy, or is held back
+                # until an earlier match is done (the queue asks for it to be dispatched then)
+                continue
             try:
-                with self._mic_lock:
-                    if not self._running or not self._listening:
-                        break
-                    with sr.Microphone() as source:
-                        audio = self._recognizer.listen(source, timeout=self._listen_timeout)
-                logging.debug('Starting analysis')
-                value = self._analyze(audio)
-                if value is None:
-                    continue
-                logging.debug('Attempting to match audio to known phrase')
-                matching_phrase = self._match_command(value)
-                if matching_phrase is not None:
-                    with self._reporting_lock:
-                        q = self._reporting_queues[matching_phrase]
-                        q.put(value)
-            except sr.WaitTimeoutError:
-                logging.debug('Timed out waiting for audio')
+                callback(value)
             except Exception as e:
-                logging.error(e, exc_info=True)
-            if not self._running:
+                logger.error(e, exc_info=True)
+        logger.debug('DISPATCHER STOPPED')
+
+    def _recognize(self) -> None:
+        logger.debug('RECOGNIZER STARTED')
+        while True:
+            audio = self._utterances.get()
+            if audio is None:
                 break
-        logging.debug('LISTENER STOPPED')
+            try:
+                logger.debug('Starting analysis')
+                if isinstance(audio, _StreamedUtterance):
+                    self._recognize_streamed(audio)
+                    continue
+                self._report(self._analyze(audio))
+            except Exception as e:
+                logger.error(e, exc_info=True)
+        logger.debug('RECOGNIZER STOPPED')